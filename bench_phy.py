@@ -0,0 +1,169 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from metrics import percentile
+from phy_client import PhyClient
+from phy_simulator import PhySimulator
+
+BAUDRATES = [115200, 230400, 460800, 921600]  # offered by the simulator for --max-baudrate
+
+
+def latency_summary(samples):
+    return {
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": statistics.mean(samples) * 1000,
+    }
+
+
+def bench_info(client, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.info()
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def bench_read_rtt(client, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.read("1", "0x01")
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def bench_sequential_dump(client, iterations):
+    reads = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for phy_addr in client.phy_addresses():
+            for reg in range(32):
+                client.read(phy_addr, reg)
+                reads += 1
+    elapsed = time.perf_counter() - start
+    return {"reads_per_s": reads / elapsed, "dump_ms": elapsed / iterations * 1000}
+
+
+def bench_pipelined_dump(client, iterations):
+    reads = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        results = client.dump()
+        reads += len(results)
+        if any(value is None for value in results.values()):
+            raise RuntimeError("pipelined dump lost responses")
+    elapsed = time.perf_counter() - start
+    return {"reads_per_s": reads / elapsed, "dump_ms": elapsed / iterations * 1000}
+
+
+def bench_log_sink(lines):
+    try:
+        import tkinter as tk
+        from tkinter import scrolledtext
+        from main import LogSink
+        root = tk.Tk()
+    except Exception as e:  # no tkinter, or tk.TclError when there is no display
+        return {"skipped": str(e)}
+
+    root.withdraw()
+    sink = LogSink(root)
+    for _ in range(2):
+        console = scrolledtext.ScrolledText(root, state='disabled')
+        sink.attach(console)
+
+    start = time.perf_counter()
+    for index in range(lines):
+        sink.write(f"[00:00:00.000] READ_RESPONSE PHY: 1 REG: 0x01 VALUE: {index & 0xFFFF:04X}\n")
+        if index % 100 == 99:
+            sink.flush()  # one flush per frame's worth of lines
+    sink.flush()
+    root.update()
+    elapsed = time.perf_counter() - start
+    root.destroy()
+    return {"us_per_line": elapsed / lines * 1e6}
+
+
+def run(args):
+    simulator = PhySimulator(latency=args.latency, jitter=args.jitter, baudrate=args.baudrate,
+                             baudrates=BAUDRATES, seed=1)
+    client = PhyClient()
+    client.connect(simulator.start())
+    try:
+        client.info()
+        if args.binary and not client.enable_binary():
+            raise RuntimeError("simulator did not accept binary framing")
+        if args.max_baudrate and args.baudrate and client.negotiate_baudrate(args.max_baudrate) == args.baudrate:
+            raise RuntimeError("simulator did not accept a faster baud rate")
+        return {
+            "info": bench_info(client, max(1, args.iterations // 10)),
+            "read_rtt": bench_read_rtt(client, args.iterations),
+            "sequential_dump": bench_sequential_dump(client, max(1, args.iterations // 50)),
+            "pipelined_dump": bench_pipelined_dump(client, max(1, args.iterations // 10)),
+            "log_sink": bench_log_sink(args.log_lines),
+        }
+    finally:
+        client.disconnect()
+        simulator.stop()
+
+
+# Metrics where a larger number is better; everything else is a time
+HIGHER_IS_BETTER = {"reads_per_s"}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for bench, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(bench, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(reference, (int, float)) or not reference:
+                continue
+            change = (value - reference) / reference
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{bench}.{metric}: {reference:.3f} -> {value:.3f} ({change:+.0%} worse)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transaction latency and throughput benchmarks against the PHY simulator")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0005, help="simulated firmware latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0002)
+    parser.add_argument("--baudrate", type=int, default=115200, help="emulated link speed; 0 for unthrottled")
+    parser.add_argument("--binary", action="store_true", help="negotiate binary framing before measuring")
+    parser.add_argument("--max-baudrate", type=int, default=None, help="negotiate up to this baud rate first")
+    parser.add_argument("--log-lines", type=int, default=20000)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    args = parser.parse_args(argv)
+    args.baudrate = args.baudrate or None
+
+    results = run(args)
+    for bench, metrics in results.items():
+        print(f"{bench}:")
+        for metric, value in metrics.items():
+            print(f"  {metric:>12}: {value:.3f}" if isinstance(value, float) else f"  {metric:>12}: {value}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
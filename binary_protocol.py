@@ -0,0 +1,94 @@
+import struct
+
+# Framed register access, negotiated after INFO with firmware that advertises
+# "Protocol: ..., BIN1". Every request and response is one fixed-size frame:
+#
+#   SYNC | seq (u16) | op | phy | reg | value (u16) | crc8
+#
+# All text the firmware prints is 7-bit ASCII, so the 0xA5 sync byte can only start a
+# frame and frames can be interleaved with ordinary text lines on the same link.
+PROTOCOL_NAME = "BIN1"
+MODE_COMMAND = "MODE_BIN1"
+MODE_ACK = "MODE_BIN1 OK"
+
+SYNC = 0xA5
+FRAME = struct.Struct(">BHBBBH")
+FRAME_SIZE = FRAME.size + 1
+
+OP_READ = 0x01
+OP_WRITE = 0x02
+OP_RESPONSE = 0x80  # set by the firmware on replies
+OP_ERROR = 0x40  # set together with OP_RESPONSE when the access failed
+
+
+def make_crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = make_crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+class Frame:
+    __slots__ = ("seq", "op", "phy", "reg", "value")
+
+    def __init__(self, seq, op, phy, reg, value=0):
+        self.seq = seq
+        self.op = op
+        self.phy = phy
+        self.reg = reg
+        self.value = value
+
+    @property
+    def is_error(self):
+        return bool(self.op & OP_ERROR)
+
+    @property
+    def request_op(self):
+        return self.op & ~(OP_RESPONSE | OP_ERROR)
+
+
+def encode_frame(seq, op, phy, reg, value=0):
+    body = FRAME.pack(SYNC, seq & 0xFFFF, op, phy, reg, value & 0xFFFF)
+    return body + bytes((crc8(body),))
+
+
+def decode_frame(data):
+    if len(data) != FRAME_SIZE or data[0] != SYNC or crc8(data[:-1]) != data[-1]:
+        return None
+    _, seq, op, phy, reg, value = FRAME.unpack(data[:-1])
+    return Frame(seq, op, phy, reg, value)
+
+
+def extract_frames(buffer):
+    # Pulls complete frames out of a bytearray in place and returns them. Bytes of a frame
+    # that is still arriving stay in the buffer; a bad CRC drops only the sync byte so the
+    # scan resynchronises on the next one.
+    frames = []
+    start = buffer.find(SYNC)
+    while start >= 0 and len(buffer) - start >= FRAME_SIZE:
+        frame = decode_frame(bytes(buffer[start:start + FRAME_SIZE]))
+        if frame is None:
+            del buffer[start]
+        else:
+            del buffer[start:start + FRAME_SIZE]
+            frames.append(frame)
+        start = buffer.find(SYNC, start)
+    return frames
+
+
+def supports_binary(device):
+    protocols = device.properties.get("PROTOCOL", "") if device else ""
+    return PROTOCOL_NAME in [name.strip().upper() for name in protocols.split(",")]
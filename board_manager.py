@@ -0,0 +1,171 @@
+import os
+import selectors
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from phy_client import PhyClient
+
+
+class Board:
+    def __init__(self, port):
+        self.port = port
+        self.client = PhyClient()
+        self.device = None
+        self.error = None
+        self.selected = False  # registered with the selector loop rather than a reader thread
+
+    @property
+    def serial_manager(self):
+        return self.client.serial_manager
+
+    @property
+    def name(self):
+        return self.device.name if self.device else self.port
+
+
+class BoardManager:
+    # Many boards on one event loop: a single selector thread reads every open port and runs
+    # transaction timeouts, so N boards cost one thread instead of N. Opening ports and the
+    # INFO handshake run in parallel on a worker pool because both may block.
+    def __init__(self, max_workers=16, binary=True):
+        self.boards = {}  # port -> Board
+        self.binary = binary
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="board")
+        self.selector = selectors.DefaultSelector()
+        self.changes = deque()  # selector (un)registrations, applied on the loop thread
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_read, False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="board-selector", daemon=True)
+        self.thread.start()
+
+    def wake(self):
+        try:
+            os.write(self.wake_write, b"\0")
+        except OSError:
+            pass
+
+    def open(self, ports, baudrate=115200, info_timeout=2.0):
+        futures = [self.executor.submit(self.open_board, port, baudrate, info_timeout) for port in ports]
+        return [future.result() for future in futures]
+
+    def open_board(self, port, baudrate, info_timeout):
+        board = self.boards.get(port) or Board(port)
+        self.boards[port] = board
+        try:
+            if not board.client.connected:
+                board.client.connect(port, baudrate, reader=False)
+                self.attach(board)
+            board.device = board.client.info(timeout=info_timeout)
+            if self.binary:
+                board.client.enable_binary()
+            board.error = None
+        except Exception as e:
+            board.error = e
+        return board
+
+    def attach(self, board):
+        try:
+            board.serial_manager.fileno()
+        except (AttributeError, OSError):
+            # No selectable handle on this platform (e.g. Windows): give it a reader thread
+            board.serial_manager.start_reader()
+            return
+        board.selected = True
+        self.changes.append(("add", board))
+        self.wake()
+
+    def close(self, port):
+        board = self.boards.pop(port, None)
+        if not board:
+            return
+        if board.selected:
+            done = threading.Event()
+            self.changes.append(("remove", board, done))
+            self.wake()
+            done.wait(timeout=1)
+        board.client.disconnect()
+
+    def close_all(self):
+        for port in list(self.boards):
+            self.close(port)
+
+    def shutdown(self):
+        self.close_all()
+        self.stop_event.set()
+        self.wake()
+        self.thread.join(timeout=1)
+        self.executor.shutdown(wait=False)
+
+    def apply_changes(self):
+        while self.changes:
+            change = self.changes.popleft()
+            board = change[1]
+            if change[0] == "add":
+                self.selector.register(board.serial_manager.fileno(), selectors.EVENT_READ, board)
+            else:
+                try:
+                    self.selector.unregister(board.serial_manager.fileno())
+                except (KeyError, ValueError, OSError):
+                    pass
+                change[2].set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.apply_changes()
+            for key, _ in self.selector.select(timeout=0.05):
+                board = key.data
+                if board is None:
+                    try:
+                        os.read(self.wake_read, 4096)
+                    except OSError:
+                        pass
+                    continue
+                if not board.serial_manager.read_available():
+                    # Unplugged; stop polling the dead handle, the board keeps its reader_error
+                    self.selector.unregister(key.fileobj)
+                    board.selected = False
+            for board in list(self.boards.values()):
+                if board.selected:
+                    board.serial_manager.transactions.expire()
+
+    def connected_boards(self):
+        return [board for board in self.boards.values() if board.client.connected and not board.error]
+
+    def broadcast(self, command):
+        for board in self.connected_boards():
+            board.client.send(command)
+
+    def call_all(self, func, phy_addr=None):
+        for board in self.connected_boards():
+            board.client.call(func, phy_addr)
+
+    def dump_all(self, registers=range(32), use_cache=False):
+        # Queue every board's batch before waiting on any, so all links are busy at once
+        pending = {board.port: board.client.submit_dump(None, registers, use_cache=use_cache)
+                   for board in self.connected_boards()}
+        results = {}
+        for port, transactions in pending.items():
+            values = {}
+            for txn in transactions:
+                try:
+                    values[(txn.phy, txn.reg)] = txn.wait()
+                except Exception:
+                    values[(txn.phy, txn.reg)] = None
+            results[port] = values
+        return results
+
+    def latency(self):
+        return {board.port: board.client.latency() for board in self.connected_boards()}
+
+    def read_all(self, phy_addr, reg_id):
+        pending = {board.port: board.client.submit_read(phy_addr, reg_id) for board in self.connected_boards()}
+        results = {}
+        for port, txn in pending.items():
+            try:
+                results[port] = txn.wait()
+            except Exception:
+                results[port] = None
+        return results
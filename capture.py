@@ -0,0 +1,275 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+
+from phy_client import PhyClient
+from transactions import parse_number
+
+# Append-only session capture. The file is a 16-byte header (magic, wall-clock start time)
+# followed by records:
+#
+#   t (f64) | kind | phy | reg | value (u16) | length (u16) | text (length bytes, UTF-8)
+#
+# t is monotonic seconds since the capture started. phy, reg and value are only set on READ
+# and WRITE records, the register transactions parsed from the traffic. A sidecar ".idx" file
+# holds (t, offset) pairs written every INDEX_INTERVAL seconds, so a reader can jump to a
+# point in time without scanning. Both files are only ever appended to, and a capture cut
+# short by a crash stays readable up to its last complete record.
+MAGIC = b"PHYCAP1\n"
+HEADER = struct.Struct("<8sd")
+RECORD = struct.Struct("<dBBBHH")
+INDEX_ENTRY = struct.Struct("<dQ")
+INDEX_INTERVAL = 1.0
+
+RX = 1
+TX = 2
+READ = 3
+WRITE = 4
+KIND_NAMES = {RX: "RX", TX: "TX", READ: "READ", WRITE: "WRITE"}
+NO_REGISTER = 0xFF
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.index = open(index_path(path), 'wb')
+        self.start = time.monotonic()
+        self.started_at = time.time()
+        self.file.write(HEADER.pack(MAGIC, self.started_at))
+        self.offset = HEADER.size
+        self.next_index = 0.0
+        self.records = 0
+        self.lock = threading.Lock()  # records arrive from the reader thread and from senders
+
+    def append(self, kind, text="", phy=NO_REGISTER, reg=NO_REGISTER, value=0):
+        payload = text.encode()[:0xFFFF]
+        with self.lock:
+            if self.file is None:
+                return
+            t = time.monotonic() - self.start
+            if t >= self.next_index:
+                # Flush first so an index entry never points past what is on disk
+                self.file.flush()
+                self.index.write(INDEX_ENTRY.pack(t, self.offset))
+                self.index.flush()
+                self.next_index = t + INDEX_INTERVAL
+            self.file.write(RECORD.pack(t, kind, phy & 0xFF, reg & 0xFF, value & 0xFFFF, len(payload)))
+            self.file.write(payload)
+            self.offset += RECORD.size + len(payload)
+            self.records += 1
+
+    def rx(self, line):
+        self.append(RX, line)
+
+    def tx(self, line):
+        self.append(TX, line)
+
+    def transaction(self, kind, phy, reg, value):
+        # kind is the TransactionEngine operation name, "read" or "write"
+        self.append(READ if kind == "read" else WRITE, "", phy, reg, value)
+
+    def close(self):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.index.close()
+            self.file = self.index = None
+
+
+class CaptureRecord:
+    __slots__ = ("t", "kind", "phy", "reg", "value", "text", "time")
+
+    def __init__(self, t, kind, phy, reg, value, text, wall_time):
+        self.t = t
+        self.kind = kind
+        self.phy = phy
+        self.reg = reg
+        self.value = value
+        self.text = text
+        self.time = wall_time
+
+    @property
+    def kind_name(self):
+        return KIND_NAMES.get(self.kind, str(self.kind))
+
+    def describe(self):
+        if self.kind in (READ, WRITE):
+            return f"{self.kind_name} PHY {self.phy} REG 0x{self.reg:02X}: {self.value:04X}"
+        return f"{self.kind_name} {self.text}"
+
+
+def map_file(path):
+    # mmap refuses empty files; treat them (and missing index files) as no data
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+class CaptureReader:
+    # Reads a capture through mmap, so only the pages a query touches are loaded. The index
+    # is by time only: a query skips to its start time, then walks every record up to its
+    # end. A capture that is still being written can be opened; records appended later are
+    # not seen.
+    def __init__(self, path):
+        self.path = path
+        self.data = map_file(path)
+        if self.data is None or len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is empty")
+        magic, self.started_at = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a PHY capture")
+        self.index = map_file(index_path(path))
+        self.index_count = len(self.index) // INDEX_ENTRY.size if self.index else 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for data in (self.data, self.index):
+            if data is not None:
+                data.close()
+        self.data = self.index = None
+
+    def seek(self, start):
+        # Offset of the last indexed record at or before start; binary search over the index
+        if start is None or not self.index_count:
+            return HEADER.size
+        low, high = 0, self.index_count
+        while low < high:
+            middle = (low + high) // 2
+            if INDEX_ENTRY.unpack_from(self.index, middle * INDEX_ENTRY.size)[0] <= start:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return HEADER.size
+        return INDEX_ENTRY.unpack_from(self.index, (low - 1) * INDEX_ENTRY.size)[1]
+
+    def records(self, start=None, end=None, kinds=None, phy=None, reg=None):
+        # start/end are seconds since the capture started. Filtering by phy or reg only
+        # matches READ/WRITE records; the header is checked before the text is decoded, but
+        # every record in the time range is still visited, so without start/end a register
+        # filter touches the whole file.
+        data = self.data
+        size = len(data)
+        offset = self.seek(start)
+        while offset + RECORD.size <= size:
+            t, kind, record_phy, record_reg, value, length = RECORD.unpack_from(data, offset)
+            body = offset + RECORD.size
+            if body + length > size:
+                return  # truncated tail of an interrupted capture
+            offset = body + length
+            if start is not None and t < start:
+                continue
+            if end is not None and t > end:
+                return
+            if kinds and kind not in kinds:
+                continue
+            if phy is not None and record_phy != phy:
+                continue
+            if reg is not None and record_reg != reg:
+                continue
+            text = data[body:offset].decode(errors='replace')
+            yield CaptureRecord(t, kind, record_phy, record_reg, value, text, self.started_at + t)
+
+
+def replay(reader, client=None, start=None, end=None, speed=None, on_record=None):
+    # Runs a capture back through the live parsers: RX lines go through SerialManager.feed()
+    # so the INFO collector and READ_RESPONSE handling see exactly what came off the wire.
+    # The client is never connected, so nothing is sent. speed paces the replay relative
+    # to real time (2.0 = twice as fast); None replays as fast as possible.
+    client = client or PhyClient()
+    serial_manager = client.serial_manager
+    cache = serial_manager.transactions.cache
+    previous = None
+    for record in reader.records(start, end):
+        if speed and previous is not None:
+            time.sleep(max(0.0, (record.t - previous) / speed))
+        previous = record.t
+
+        if record.kind == TX and record.text == "INFO":
+            client.request_info()
+        elif record.kind == RX:
+            serial_manager.feed(record.text.encode() + b"\n")
+        elif record.kind == READ:
+            cache.update(record.phy, record.reg, record.value)
+        elif record.kind == WRITE:
+            cache.mark_written(record.phy, record.reg, record.value)
+        if on_record:
+            on_record(record)
+    return client
+
+
+def parse_kinds(text):
+    names = {name: kind for kind, name in KIND_NAMES.items()}
+    try:
+        return {names[name.strip().upper()] for name in text.split(",")}
+    except KeyError as e:
+        raise argparse.ArgumentTypeError(f"unknown record kind {e}")
+
+
+def cmd_show(reader, args):
+    for record in reader.records(args.start, args.end, args.kind, args.phy, args.reg):
+        moment = datetime.fromtimestamp(record.time).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        print(f"[{moment}] +{record.t:.3f} {record.describe()}")
+
+
+def cmd_replay(reader, args):
+    client = replay(reader, start=args.start, end=args.end)
+    device = client.device
+    if device:
+        print(f"Device: {device.name}")
+        for phy in device.phys:
+            print(phy.label)
+    for (phy, reg), entry in sorted(client.transactions.cache.entries.items()):
+        print(f"PHY {phy} REG 0x{reg:02X}: {entry.value:04X}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay PHY session captures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("show", "print records, optionally filtered"),
+                            ("replay", "rebuild device info and last register values")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("capture")
+        command.add_argument("--start", type=float, help="seconds since the capture started")
+        command.add_argument("--end", type=float, help="seconds since the capture started")
+        if name == "show":
+            command.add_argument("--kind", type=parse_kinds, help="comma-separated: RX, TX, READ, WRITE")
+            command.add_argument("--phy", type=parse_number)
+            command.add_argument("--reg", type=parse_number)
+    args = parser.parse_args(argv)
+
+    try:
+        reader = CaptureReader(args.capture)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    with reader:
+        try:
+            {"show": cmd_show, "replay": cmd_replay}[args.command](reader, args)
+        except BrokenPipeError:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
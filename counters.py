@@ -0,0 +1,179 @@
+import threading
+import time
+from array import array
+
+from transactions import parse_number
+
+
+class RingBuffer:
+    # Fixed-size (time, value) history in two preallocated arrays. Once full, each new sample
+    # overwrites the oldest, so memory stays the same however long sampling runs.
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, value):
+        with self.lock:
+            index = (self.start + self.count) % self.capacity
+            self.times[index] = t
+            self.values[index] = value
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.start = (self.start + 1) % self.capacity
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None
+            index = (self.start + self.count - 1) % self.capacity
+            return self.times[index], self.values[index]
+
+    def segments(self, first, last):
+        # Physical slices covering logical samples first..last-1 (oldest is 0)
+        begin = (self.start + first) % self.capacity
+        length = last - first
+        if begin + length <= self.capacity:
+            return [(begin, begin + length)]
+        return [(begin, self.capacity), (0, begin + length - self.capacity)]
+
+    def index_at(self, t):
+        # First logical sample at or after t; times only ever increase
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[(self.start + middle) % self.capacity] < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def minmax(self, buckets, since=None):
+        # Splits the samples since `since` into at most `buckets` runs and returns
+        # (time of first sample, min, max) for each. The result, and so what it costs to draw,
+        # is bounded by the plot width, but min()/max() still scan every sample in range: a
+        # refresh is O(samples since `since`), up to the whole buffer for the full history.
+        # The Python loop is per bucket, with the scans over array slices in C.
+        with self.lock:
+            first = self.index_at(since) if since is not None else 0
+            total = self.count - first
+            if total <= 0 or buckets <= 0:
+                return []
+            result = []
+            for bucket in range(min(buckets, total)):
+                begin = first + total * bucket // min(buckets, total)
+                end = first + total * (bucket + 1) // min(buckets, total)
+                low = high = None
+                for a, b in self.segments(begin, end):
+                    chunk = self.values[a:b]
+                    low = min(chunk) if low is None else min(low, min(chunk))
+                    high = max(chunk) if high is None else max(high, max(chunk))
+                result.append((self.times[(self.start + begin) % self.capacity], low, high))
+            return result
+
+
+class CounterSeries:
+    # One counter register of one PHY. Rates are counts per second between consecutive
+    # samples; a counter that is not cleared on read is assumed to wrap at 16 bits.
+    def __init__(self, client, phy_addr, reg, label="", clear_on_read=False, capacity=86400):
+        self.client = client
+        self.phy_addr = phy_addr
+        self.phy = parse_number(phy_addr)
+        self.reg = reg
+        self.label = label or f"PHY {self.phy} 0x{reg:02X}"
+        self.clear_on_read = clear_on_read
+        self.rates = RingBuffer(capacity)
+        self.last_value = None
+        self.last_time = None
+        self.total = 0
+        self.errors = 0
+
+    @property
+    def key(self):
+        return (id(self.client), self.phy, self.reg)
+
+    def sample(self, t, value):
+        if self.last_value is not None or self.clear_on_read:
+            delta = value if self.clear_on_read else (value - self.last_value) & 0xFFFF
+            self.total += delta
+            if self.last_time is not None and t > self.last_time:
+                self.rates.append(t, delta / (t - self.last_time))
+        self.last_value = value
+        self.last_time = t
+
+
+class CounterSampler:
+    # Reads every counter once per interval. Each tick queues one pipelined burst per board
+    # before waiting on any, like BoardManager.dump_all().
+    def __init__(self, interval=1.0, capacity=86400, on_sample=None):
+        self.interval = interval
+        self.capacity = capacity  # samples kept per counter, 24 hours at 1 s
+        self.on_sample = on_sample  # called from the sampler thread after each tick
+        self.series = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def add(self, client, phy_addr, reg_id, label="", clear_on_read=False):
+        series = CounterSeries(client, phy_addr, parse_number(reg_id), label, clear_on_read, self.capacity)
+        with self.lock:
+            self.series.setdefault(series.key, series)
+            return self.series[series.key]
+
+    def remove(self, series):
+        with self.lock:
+            self.series.pop(series.key, None)
+
+    def clear(self):
+        with self.lock:
+            self.series = {}
+
+    def start(self):
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="counter-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        next_due = time.time()
+        while not self.stop_event.is_set():
+            self.sample()
+            if self.on_sample:
+                self.on_sample()
+            # Keep the cadence, but never try to catch up on missed samples
+            next_due = max(next_due + self.interval, time.time())
+            self.stop_event.wait(next_due - time.time())
+
+    def sample(self):
+        with self.lock:
+            series = list(self.series.values())
+        by_client = {}
+        for entry in series:
+            if entry.client.connected:
+                by_client.setdefault(entry.client, []).append(entry)
+        pending = [(entries, client.transactions.read_many([(entry.phy_addr, entry.reg) for entry in entries]))
+                   for client, entries in by_client.items()]
+        for entries, transactions in pending:
+            for entry, txn in zip(entries, transactions):
+                try:
+                    value = txn.wait()
+                except Exception:
+                    entry.errors += 1
+                    continue
+                # Timestamp at the response so queueing behind other traffic does not skew rates
+                entry.sample(time.time(), value)
@@ -1,34 +1,82 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext
-import serial
-import serial.tools.list_ports
+from tkinter import ttk, scrolledtext, filedialog
+import csv
+import threading
 import time
+from collections import deque
 from datetime import datetime
 
-class SerialManager:
-    def __init__(self):
-        self.ser = None
-        self.port_map = {}
-
-    def list_ports(self):
-        ports = serial.tools.list_ports.comports()
-        self.port_map = {f"{port.device} - {port.description}": port.device for port in ports}
-        return list(self.port_map.keys())
-
-    def connect(self, port, baudrate=115200):
-        self.ser = serial.Serial(port, baudrate, timeout=1)
-
-    def send(self, message):
-        if self.ser and self.ser.is_open:
-            self.ser.write((message + "\n").encode())
+from board_manager import BoardManager
+from capture import RX, TX, CaptureReader, CaptureWriter, replay
+from counters import CounterSampler
+from mdio_script import SCRIPT_HELP, ScriptError, ScriptRunner, parse_script
+from phy_client import PhyClient
+from register_watch import RegisterWatcher, flipped_bits
+from serial_manager import PortWatcher, board_ports, usb_id
+from transactions import parse_number
+
+try:
+    from snapshots import append_snapshot
+except ImportError:  # numpy is optional; without it dumps can only be saved as CSV
+    append_snapshot = None
+
+
+PLOT_COLORS = ["#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b"]
+PLOT_WINDOWS = {"5 min": 300, "1 h": 3600, "All": None}
+
+
+class LogSink:
+    # Buffers console output and writes it to the Tk text widgets at most once per frame
+    def __init__(self, root, max_lines=2000, history_size=50000, flush_interval=16):
+        self.root = root
+        self.consoles = []
+        self.max_lines = max_lines
+        self.history = deque(maxlen=history_size)  # longer than the consoles keep, for save()
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.flush_scheduled = False
+
+    def attach(self, console):
+        self.consoles.append(console)
+
+    def write(self, line):
+        self.history.append(line)
+        self.pending.append(line)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after(self.flush_interval, self.flush)
+
+    def flush(self):
+        self.flush_scheduled = False
+        if not self.pending:
+            return
+        # Only the tail can survive trimming, so never hand Tk more than max_lines
+        lines = self.pending[-self.max_lines:] if self.max_lines else self.pending
+        text = "".join(lines)
+        self.pending = []
+
+        for console in self.consoles:
+            console['state'] = 'normal'
+            console.insert('end', text)
+            if self.max_lines:
+                line_count = int(console.index('end-1c').split('.')[0]) - 1
+                if line_count > self.max_lines:
+                    console.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+            console['state'] = 'disabled'
+            console.see('end')
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(self.history)
+
+    def clear(self):
+        self.pending = []
+        self.history.clear()
+        for console in self.consoles:
+            console['state'] = 'normal'
+            console.delete('1.0', 'end')
+            console['state'] = 'disabled'
 
-    def read_lines(self):
-        lines = []
-        while self.ser and self.ser.in_waiting:
-            line = self.ser.readline().decode(errors='ignore').strip()
-            if line:
-                lines.append(line)
-        return lines
 
 class EthernetPHYApp(tk.Tk):
     def __init__(self):
@@ -36,16 +84,35 @@ class EthernetPHYApp(tk.Tk):
         self.title("Ethernet PHY Manager")
         self.geometry("720x480")
 
-        self.serial_manager = SerialManager()
+        self.client = PhyClient()
+        self.serial_manager = self.client.serial_manager
+        self.log_sink = LogSink(self)
         self.port_map = {}
-        self.device_id = ""
+        self.device_id = "device"  # tree item of the primary device
         self.connected = False
-        self.reading_info = False
-        self.device_speed = ""  # ← Add this line here
+        self.device_speed = ""
+        self.device = None  # parsed INFO response
         self.device_info = {}  # stores controller, version, speed
-        self.node_functions = {}  # maps tree item IDs to list of functions
-
-        self.after(0, self.auto_scan_ports)              # Start scanning immediately
+        self.node_actions = {}  # tree item -> (functions, PHY address or None for the device, client)
+        self.node_panels = {}  # tree item -> its function button frame, built on first selection
+        self.active_panel = None
+        self.dump_window = None
+        self.dump_rows = {}  # transaction -> table row
+        self.script_runner = None
+        self.boards = None  # BoardManager for extra boards, created on first "Connect All"
+        self.board_nodes = {}  # port -> tree item of that board's device node
+        self.watcher = RegisterWatcher(self.client, on_change=self.queue_watch_change)
+        self.watch_rows = {}  # (phy, reg) -> table row
+        self.watch_changes = {}  # latest change per register, waiting for the next UI flush
+        self.watch_flush_pending = False
+        self.watch_lock = threading.Lock()  # guards the two above; the watcher thread fills them
+        self.counters = CounterSampler()
+        self.counter_items = {}  # series key -> (line item, legend item)
+        self.ui_calls = deque()  # callbacks posted from worker threads
+        self.serial_event_pending = False
+        self.serial_manager.on_data = self.notify_serial_data
+
+        self.port_watcher = PortWatcher(lambda *change: self.call_in_ui(self.on_ports_changed, *change))
         self.after(500, self.check_serial_connection)    # Start hardware check
 
 
@@ -53,23 +120,30 @@ class EthernetPHYApp(tk.Tk):
 
 
         self.create_widgets()
+        self.bind('<<SerialData>>', self.process_serial_data)
+        self.after(0, self.port_watcher.start)           # Start scanning once the event loop runs
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        
 
     def create_widgets(self):
         tab_control = ttk.Notebook(self)
         self.home_tab = ttk.Frame(tab_control)
         self.register_tab = ttk.Frame(tab_control)
         self.raw_mdio_tab = ttk.Frame(tab_control)
+        self.watch_tab = ttk.Frame(tab_control)
         self.settings_tab = ttk.Frame(tab_control)
 
         tab_control.add(self.home_tab, text='Home')
         tab_control.add(self.register_tab, text='Register Edit')
         tab_control.add(self.raw_mdio_tab, text='Raw MDIO')
+        tab_control.add(self.watch_tab, text='Watch')
         tab_control.add(self.settings_tab, text='Settings')
         tab_control.pack(expand=1, fill='both')
         self.setup_home_tab()
         self.setup_register_tab()
+        self.setup_raw_mdio_tab()
+        self.setup_watch_tab()
+        self.setup_settings_tab()
 
 
 
@@ -92,12 +166,19 @@ class EthernetPHYApp(tk.Tk):
         self.connect_button = ttk.Button(frame, text="Connect", command=self.connect_device)
         self.connect_button.pack(side='left', padx=5)
 
+        self.connect_all_button = ttk.Button(frame, text="Connect All", command=self.connect_all_boards)
+        self.connect_all_button.pack(side='left', padx=5)
+
+        self.dump_all_button = ttk.Button(frame, text="Dump All", command=self.dump_all_boards)
+        self.dump_all_button.pack(side='left', padx=5)
+
         content_frame = ttk.Frame(self.home_tab)
         content_frame.pack(fill='both', expand=True, padx=10, pady=10)
 
         # Treeview on the left
         self.tree = ttk.Treeview(content_frame)
         self.tree.heading("#0", text="Devices")
+        self.tree.tag_configure('offline', foreground='gray')
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
         self.tree.pack(side='left', fill='y')
 
@@ -111,8 +192,8 @@ class EthernetPHYApp(tk.Tk):
         self.speed_label = ttk.Label(self.interaction_frame, text="", anchor='w', justify='left')
         self.speed_label.pack(pady=2, fill='x')
 
-        self.button_frame = ttk.Frame(self.interaction_frame)
-        self.button_frame.pack(pady=5)
+        self.setup_counter_plot(self.interaction_frame)
+
 
         # Container frame for serial monitor + dev note
         self.serial_container = ttk.Frame(self.home_tab)
@@ -129,8 +210,17 @@ class EthernetPHYApp(tk.Tk):
         self.hide_console_button = ttk.Button(header_frame, text="Hide Serial Monitor", command=self.toggle_serial_monitor)
         self.hide_console_button.pack(side='right', padx=5, pady=5)
 
+        self.replay_button = ttk.Button(header_frame, text="Replay...", command=self.replay_capture)
+        self.replay_button.pack(side='right', padx=5, pady=5)
+
+        ttk.Button(header_frame, text="Save Log...", command=self.save_log).pack(side='right', padx=5, pady=5)
+
+        self.record_button = ttk.Button(header_frame, text="Record", command=self.toggle_capture)
+        self.record_button.pack(side='right', padx=5, pady=5)
+
         self.console_home = scrolledtext.ScrolledText(self.serial_frame, height=5, state='disabled')
         self.console_home.pack(fill='x', expand=False)
+        self.log_sink.attach(self.console_home)
 
         self.serial_frame.pack(fill='x', padx=10, pady=(5, 2))  # Slight padding under monitor
 
@@ -146,32 +236,177 @@ class EthernetPHYApp(tk.Tk):
 
 
 
-    def check_serial_connection(self):
-        if self.connected and self.serial_manager.ser:
-            try:
-                self.serial_manager.ser.in_waiting  # This triggers a check
-            except (serial.SerialException, OSError):
-                self.log("Device unplugged. Forcing disconnect.")
-                self.force_disconnect()
+    def setup_counter_plot(self, parent):
+        # Packed at the bottom so the per-node button panels swap in above it
+        frame = ttk.Frame(parent)
+        frame.pack(side='bottom', fill='both', expand=True, pady=(5, 0))
+
+        controls = ttk.Frame(frame)
+        controls.pack(fill='x')
+        ttk.Label(controls, text="Counter Reg:").pack(side='left')
+        self.counter_reg_entry = ttk.Entry(controls, width=6)
+        self.counter_reg_entry.pack(side='left', padx=(0, 5))
+        self.counter_clear_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Clear on read", variable=self.counter_clear_var).pack(side='left')
+        ttk.Button(controls, text="Add", command=self.add_counter).pack(side='left', padx=5)
+        ttk.Button(controls, text="Clear", command=self.clear_counters).pack(side='left')
+        self.counter_button = ttk.Button(controls, text="Start", command=self.toggle_counters)
+        self.counter_button.pack(side='right')
+        self.counter_window = ttk.Combobox(controls, state='readonly', width=6, values=list(PLOT_WINDOWS))
+        self.counter_window.current(0)
+        self.counter_window.pack(side='right', padx=5)
+
+        self.counter_canvas = tk.Canvas(frame, height=140, background='white', highlightthickness=0)
+        self.counter_canvas.pack(fill='both', expand=True, pady=(5, 0))
+        self.counter_scale = self.counter_canvas.create_text(4, 4, anchor='nw', fill='gray')
+        self.after(1000, self.refresh_counter_plot)
+
+    def add_counter(self):
+        selection = self.tree.selection()
+        _, phy_address, client = self.node_actions.get(selection[0], ((), None, None)) if selection else ((), None, None)
+        if phy_address is None or client is None:
+            self.log("Select a PHY in the device tree to add a counter.")
+            return
+        try:
+            series = self.counters.add(client, phy_address, self.counter_reg_entry.get().strip(),
+                                       clear_on_read=self.counter_clear_var.get())
+        except ValueError:
+            self.log("Invalid counter register.")
+            return
+        if series.key not in self.counter_items:
+            color = PLOT_COLORS[len(self.counter_items) % len(PLOT_COLORS)]
+            self.counter_items[series.key] = (self.counter_canvas.create_line(0, 0, 0, 0, fill=color),
+                                              self.counter_canvas.create_text(0, 0, anchor='ne', fill=color))
+
+    def clear_counters(self):
+        self.counters.clear()
+        for line, legend in self.counter_items.values():
+            self.counter_canvas.delete(line, legend)
+        self.counter_items = {}
+
+    def toggle_counters(self):
+        if self.counters.running:
+            self.counters.stop()
+            self.counter_button.config(text="Start")
+        else:
+            self.counters.start()
+            self.counter_button.config(text="Stop")
+
+    def refresh_counter_plot(self):
+        # Redraws rates from the ring buffers once a second. Each series is one line item whose
+        # coordinates are replaced, with two points (min, max) per bucket of two pixels, so the
+        # canvas work stays the same whether the window holds minutes or hours of samples.
+        self.after(1000, self.refresh_counter_plot)
+        canvas = self.counter_canvas
+        if not canvas.winfo_ismapped():
+            return
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        window = PLOT_WINDOWS.get(self.counter_window.get())
+        now = time.time()
+        since = now - window if window else None
+
+        series = [entry for entry in self.counters.series.values() if entry.key in self.counter_items]
+        buckets = {entry.key: entry.rates.minmax(max(1, width // 2), since) for entry in series}
+        start = since if since is not None else min((points[0][0] for points in buckets.values() if points),
+                                                    default=now)
+        span = max(now - start, 1e-6)
+        top = max((high for points in buckets.values() for _, _, high in points), default=0) or 1.0
+        margin = 16
+
+        for index, entry in enumerate(series):
+            line, legend = self.counter_items[entry.key]
+            coords = []
+            for t, low, high in buckets[entry.key]:
+                x = (t - start) / span * width
+                coords += [x, height - low / top * (height - margin), x, height - high / top * (height - margin)]
+            if len(coords) < 4:
+                coords = [0, height, 0, height]
+            canvas.coords(line, *coords)
+            latest = entry.rates.latest()
+            rate = f"{latest[1]:.1f}/s" if latest else "-"
+            canvas.coords(legend, width - 4, 4 + index * 14)
+            canvas.itemconfig(legend, text=f"{entry.label}: {rate}, total {entry.total}")
+        canvas.itemconfig(self.counter_scale, text=f"max {top:.1f}/s")
 
+    def check_serial_connection(self):
+        # Safety net in case a wakeup from a worker thread was lost
+        if self.ui_calls or self.serial_manager.lines:
+            self.process_serial_data()
+        self.handle_reader_error()
         self.after(500, self.check_serial_connection)
 
+    def handle_reader_error(self):
+        if self.connected and self.serial_manager.reader_error:
+            self.log("Device unplugged. Forcing disconnect.")
+            self.force_disconnect()
 
+        for port, board in list(self.boards.boards.items()) if self.boards else []:
+            if board.serial_manager.reader_error:
+                self.log(f"[{port}] Device unplugged.")
+                self.close_board(port)
 
 
+    def notify_serial_data(self):
+        # Runs on the reader thread: wake the Tk loop once per burst of lines
+        if self.serial_event_pending:
+            return
+        self.serial_event_pending = True
+        try:
+            self.event_generate('<<SerialData>>', when='tail')
+        except (RuntimeError, tk.TclError):
+            self.serial_event_pending = False
+
+    def call_in_ui(self, func, *args):
+        self.ui_calls.append((func, args))
+        self.notify_serial_data()
+
+    def process_serial_data(self, event=None):
+        self.serial_event_pending = False
+        lines = self.serial_manager.read_timestamped()
+        for timestamp, line in lines:
+            self.log(line, timestamp)
+        for port, board in list(self.boards.boards.items()) if self.boards else []:
+            for timestamp, line in board.serial_manager.read_timestamped():
+                self.log(f"[{port}] {line}", timestamp)
+
+        while self.ui_calls:
+            func, args = self.ui_calls.popleft()
+            func(*args)
+
+        self.handle_reader_error()
+
+
+
+
+    def on_close(self):
+        # Extra boards keep their ports open and the board manager its threads; release them,
+        # and the primary port, before the window goes
+        self.port_watcher.stop()
+        self.watcher.stop()
+        self.counters.stop()
+        if self.script_runner:
+            self.script_runner.stop()
+        if self.boards:
+            self.boards.shutdown()
+        if self.serial_manager.capture:
+            self.toggle_capture()
+        self.client.disconnect()
+        self.destroy()
+
     def force_disconnect(self):
+        self.watcher.stop()
+        self.watch_button.config(text="Start")
+        self.client.disconnect()
         self.connected = False
-        self.reading_info = False
         self.connect_button.config(text="Connect")
         self.status_dot.itemconfig(self.status_circle, fill="gray")
         self.log("Disconnected")
 
-        self.tree.delete(*self.tree.get_children())
-        self.selected_label.config(text="Select a device or PHY")
-        self.speed_label.config(text="")
+        # Keep the device's items and panels, greyed out; reconnecting reconciles them in place
+        self.set_offline(self.device_id)
 
         self.port_combo.set('')
-        self.port_combo['values'] = []
+        self.update_port_combo()
 
         # --- Clear Register tab fields ---
         self.phy_selector.set('')
@@ -182,15 +417,22 @@ class EthernetPHYApp(tk.Tk):
 
         for var in self.bit_vars:
             var.set(0)
+        self.cache_status_label.config(text="")
 
-        self.reading_register = False
 
 
 
 
+    def on_ports_changed(self, ports, added, removed):
+        self.serial_manager.port_map = ports
+        for label in added:
+            self.log(f"Port added: {label}")
+        for label in removed:
+            self.log(f"Port removed: {label}")
+        self.update_port_combo()
 
-    def auto_scan_ports(self):
-        ports = self.serial_manager.list_ports()
+    def update_port_combo(self):
+        ports = list(self.serial_manager.port_map.keys())
 
         current = self.port_combo.get()
         self.port_combo['values'] = ports
@@ -203,8 +445,6 @@ class EthernetPHYApp(tk.Tk):
         else:
             self.port_combo.set('')
 
-        self.after(500, self.auto_scan_ports)
-
 
     def setup_register_tab(self):
         # Full-width container
@@ -225,6 +465,8 @@ class EthernetPHYApp(tk.Tk):
         self.register_id_entry = ttk.Entry(wrapper, width=10, validate='key')
         self.register_id_entry.grid(row=1, column=1, sticky='w', pady=2)
         self.register_id_entry['validatecommand'] = (self.register_id_entry.register(self.limit_length), '%P', 4)
+        self.register_id_entry.bind('<KeyRelease>', lambda e: self.show_cached_register())
+        self.phy_selector.bind('<<ComboboxSelected>>', lambda e: self.show_cached_register())
 
         # Divider line
         ttk.Separator(wrapper, orient='horizontal').grid(row=2, column=0, columnspan=3, sticky='ew', pady=10)
@@ -255,6 +497,23 @@ class EthernetPHYApp(tk.Tk):
         self.write_button = ttk.Button(button_frame, text="Write", command=self.write_register)
         self.write_button.pack(side='left')
 
+        self.dump_button = ttk.Button(button_frame, text="Dump", command=self.open_dump_window)
+        self.dump_button.pack(side='left', padx=5)
+
+        # Masked writes only change the bits set in the mask; the rest are read from the PHY first
+        ttk.Label(wrapper, text="Write Mask:").grid(row=5, column=0, sticky='e', padx=(0, 5), pady=(5, 0))
+        self.write_mask_var = tk.StringVar(value="FFFF")
+        self.write_mask_entry = ttk.Entry(wrapper, textvariable=self.write_mask_var, width=10, validate='key')
+        self.write_mask_entry.grid(row=5, column=1, sticky='w', pady=(5, 0))
+        self.write_mask_entry['validatecommand'] = (self.write_mask_entry.register(self.limit_length), '%P', 4)
+
+        self.verify_write_var = tk.IntVar(value=0)
+        ttk.Checkbutton(wrapper, text="Verify by read-back", variable=self.verify_write_var).grid(
+            row=5, column=2, sticky='w', padx=15, pady=(5, 0))
+
+        self.cache_status_label = ttk.Label(wrapper, text="", foreground="gray")
+        self.cache_status_label.grid(row=6, column=1, columnspan=2, sticky='w', pady=(5, 0))
+
         # Sync hex ↔ bit states
         self.register_value_var.trace_add("write", lambda *args: self.update_bits_from_hex())
 
@@ -267,7 +526,263 @@ class EthernetPHYApp(tk.Tk):
 
         self.console_register = scrolledtext.ScrolledText(monitor_frame, height=5, state='disabled')
         self.console_register.pack(fill='x')
+        self.log_sink.attach(self.console_register)
+
+
+
+    def setup_raw_mdio_tab(self):
+        toolbar = ttk.Frame(self.raw_mdio_tab)
+        toolbar.pack(fill='x', padx=10, pady=(10, 5))
+
+        ttk.Button(toolbar, text="Load", command=self.load_script).pack(side='left')
+        ttk.Button(toolbar, text="Save", command=self.save_script).pack(side='left', padx=5)
+        self.run_script_button = ttk.Button(toolbar, text="Run", command=self.run_script)
+        self.run_script_button.pack(side='left', padx=(15, 5))
+        ttk.Button(toolbar, text="Stop", command=self.stop_script).pack(side='left')
 
+        panes = ttk.PanedWindow(self.raw_mdio_tab, orient='vertical')
+        panes.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+
+        self.script_text = scrolledtext.ScrolledText(panes, height=8, undo=True)
+        self.script_text.insert('1.0', SCRIPT_HELP)
+        panes.add(self.script_text, weight=1)
+
+        self.script_results = ttk.Treeview(panes, columns=("line", "operation", "result"), show='headings', height=6)
+        for column, title, width in (("line", "Line", 50), ("operation", "Operation", 260), ("result", "Result", 160)):
+            self.script_results.heading(column, text=title)
+            self.script_results.column(column, width=width, anchor='w')
+        self.script_results.tag_configure('error', foreground='red')
+        panes.add(self.script_results, weight=1)
+
+    def load_script(self):
+        path = filedialog.askopenfilename(filetypes=[("MDIO scripts", "*.mdio *.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        with open(path) as f:
+            self.script_text.delete('1.0', 'end')
+            self.script_text.insert('1.0', f.read())
+
+    def save_script(self):
+        path = filedialog.asksaveasfilename(defaultextension=".mdio",
+                                            filetypes=[("MDIO scripts", "*.mdio *.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        with open(path, 'w') as f:
+            f.write(self.script_text.get('1.0', 'end-1c'))
+
+    def run_script(self):
+        if self.script_runner:
+            self.log("A script is already running.")
+            return
+        if not self.connected:
+            self.log("Connect to a device before running a script.")
+            return
+        try:
+            steps = parse_script(self.script_text.get('1.0', 'end'))
+        except ScriptError as e:
+            self.log(f"Script error, {e}")
+            return
+        if not steps:
+            return
+
+        self.script_results.delete(*self.script_results.get_children())
+        self.script_runner = ScriptRunner(self.client)
+        self.run_script_button.config(state='disabled')
+        self.log(f"Running MDIO script ({len(steps)} operations)")
+
+        def worker(runner=self.script_runner):
+            started = time.time()
+            try:
+                runner.run(steps, on_result=lambda result: self.call_in_ui(self.on_script_result, result))
+            finally:
+                self.call_in_ui(self.on_script_done, time.time() - started)
+
+        threading.Thread(target=worker, name="mdio-script", daemon=True).start()
+
+    def stop_script(self):
+        if self.script_runner:
+            self.script_runner.stop()
+
+    def on_script_result(self, result):
+        tags = ('error',) if result.error else ()
+        row = self.script_results.insert('', 'end', values=(result.step.line_no, result.step.text, result.text), tags=tags)
+        self.script_results.see(row)
+
+    def on_script_done(self, elapsed):
+        self.script_runner = None
+        self.run_script_button.config(state='normal')
+        self.log(f"MDIO script finished in {elapsed * 1000:.0f} ms")
+
+
+    def setup_watch_tab(self):
+        controls = ttk.Frame(self.watch_tab)
+        controls.pack(fill='x', padx=10, pady=(10, 5))
+
+        ttk.Label(controls, text="PHY:").pack(side='left')
+        self.watch_phy_combo = ttk.Combobox(controls, state='readonly', width=18,
+                                            postcommand=lambda: self.watch_phy_combo.configure(values=self.phy_selector['values']))
+        self.watch_phy_combo.pack(side='left', padx=(0, 5))
+
+        ttk.Label(controls, text="Reg:").pack(side='left')
+        self.watch_reg_entry = ttk.Entry(controls, width=6)
+        self.watch_reg_entry.pack(side='left', padx=(0, 5))
+
+        ttk.Label(controls, text="Rate (Hz):").pack(side='left')
+        self.watch_rate_entry = ttk.Entry(controls, width=5)
+        self.watch_rate_entry.insert(0, "10")
+        self.watch_rate_entry.pack(side='left', padx=(0, 5))
+
+        ttk.Button(controls, text="Add", command=self.add_watch).pack(side='left', padx=5)
+        ttk.Button(controls, text="Remove", command=self.remove_watch).pack(side='left')
+        self.watch_button = ttk.Button(controls, text="Start", command=self.toggle_watch)
+        self.watch_button.pack(side='right')
+
+        columns = (("phy", "PHY", 50), ("reg", "Register", 70), ("value", "Value", 70),
+                   ("bits", "Flipped bits", 200), ("changes", "Changes", 70), ("time", "Last change", 100))
+        self.watch_table = ttk.Treeview(self.watch_tab, columns=[c[0] for c in columns], show='headings')
+        for column, title, width in columns:
+            self.watch_table.heading(column, text=title)
+            self.watch_table.column(column, width=width, anchor='center')
+        self.watch_table.tag_configure('changed', background='#fff3a0')
+        self.watch_table.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+
+    def setup_settings_tab(self):
+        controls = ttk.Frame(self.settings_tab)
+        controls.pack(fill='x', padx=10, pady=(10, 5))
+
+        ttk.Label(controls, text="Read retries:").pack(side='left')
+        self.retries_var = tk.IntVar(value=self.client.transactions.retries)
+        retries = ttk.Spinbox(controls, from_=0, to=5, width=4, textvariable=self.retries_var,
+                              command=self.apply_retries)
+        retries.bind('<Return>', self.apply_retries)
+        retries.pack(side='left', padx=(0, 5))
+        # Connect All only opens USB adapters matching this; empty means the connected board's VID:PID
+        ttk.Label(controls, text="Board ports:").pack(side='left', padx=(15, 0))
+        self.board_match_var = tk.StringVar()
+        ttk.Entry(controls, textvariable=self.board_match_var, width=16).pack(side='left', padx=(0, 5))
+        # Off by default: the link goes back to the initial rate on disconnect, but a crash or an
+        # unplug in between leaves the board at the raised rate until it is power-cycled
+        self.raise_baud_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Raise baud rate", variable=self.raise_baud_var).pack(side='left', padx=(15, 0))
+        ttk.Button(controls, text="Reset Statistics", command=self.reset_latency).pack(side='right')
+
+        ttk.Label(self.settings_tab, text="Command latency (timeouts adapt to the observed round trip)",
+                  anchor='w').pack(fill='x', padx=10)
+        columns = (("port", "Port", 120), ("kind", "Command", 70), ("count", "Count", 60), ("p50", "p50 ms", 70),
+                   ("p95", "p95 ms", 70), ("p99", "p99 ms", 70), ("timeout", "Timeout ms", 80),
+                   ("timeouts", "Timeouts", 70), ("retries", "Retries", 60))
+        self.latency_table = ttk.Treeview(self.settings_tab, columns=[c[0] for c in columns], show='headings')
+        for column, title, width in columns:
+            self.latency_table.heading(column, text=title)
+            self.latency_table.column(column, width=width, anchor='center')
+        self.latency_table.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        self.latency_rows = {}  # (port, kind) -> table row
+        self.after(1000, self.refresh_latency)
+
+    def latency_clients(self):
+        clients = [(self.serial_manager.port, self.client)] if self.connected else []
+        if self.boards:
+            clients += [(board.port, board.client) for board in self.boards.connected_boards()]
+        return clients
+
+    def refresh_latency(self):
+        seen = set()
+        for port, client in self.latency_clients():
+            for kind, stats in client.latency().items():
+                key = (port, kind)
+                seen.add(key)
+                values = (port, kind, stats["count"],
+                          *(f"{stats[name]:.1f}" if name in stats else "" for name in ("p50_ms", "p95_ms", "p99_ms")),
+                          f"{stats['timeout_ms']:.0f}", stats["timeouts"], stats["retries"])
+                if key in self.latency_rows:
+                    self.latency_table.item(self.latency_rows[key], values=values)
+                else:
+                    self.latency_rows[key] = self.latency_table.insert('', 'end', values=values)
+        for key in [key for key in self.latency_rows if key not in seen]:
+            self.latency_table.delete(self.latency_rows.pop(key))
+        self.after(1000, self.refresh_latency)
+
+    def apply_retries(self, event=None):
+        try:
+            retries = self.retries_var.get()
+        except tk.TclError:
+            return
+        clients = [self.client] + ([board.client for board in self.boards.boards.values()] if self.boards else [])
+        for client in clients:
+            client.transactions.retries = retries
+
+    def reset_latency(self):
+        for _, client in self.latency_clients():
+            client.transactions.metrics.reset()
+
+    def add_watch(self):
+        phy = self.watch_phy_combo.get()
+        if not phy:
+            self.log("Select a PHY to watch.")
+            return
+        try:
+            rate = float(self.watch_rate_entry.get())
+        except ValueError:
+            self.log("Invalid rate.")
+            return
+        if rate <= 0:
+            self.log("Watch rate must be above 0 Hz.")
+            return
+        try:
+            entry = self.watcher.add(phy.split(" - ")[0].strip(), self.watch_reg_entry.get().strip(), rate)
+        except ValueError:
+            self.log("Invalid register.")
+            return
+
+        if entry.key not in self.watch_rows:
+            self.watch_rows[entry.key] = self.watch_table.insert(
+                '', 'end', values=(entry.phy, f"0x{entry.reg:02X}", "", "", 0, ""))
+
+    def remove_watch(self):
+        for row in self.watch_table.selection():
+            for key, watched_row in list(self.watch_rows.items()):
+                if watched_row == row:
+                    self.watcher.remove(*key)
+                    del self.watch_rows[key]
+            self.watch_table.delete(row)
+
+    def toggle_watch(self):
+        if self.watcher.running:
+            self.watcher.stop()
+            self.watch_button.config(text="Start")
+        else:
+            self.watcher.start()
+            self.watch_button.config(text="Stop")
+
+    def queue_watch_change(self, entry, old, new):
+        # Runs on the watcher thread; coalesce changes so Tk redraws at most once per wakeup
+        with self.watch_lock:
+            self.watch_changes[entry.key] = (entry, old, new)
+            schedule = not self.watch_flush_pending
+            self.watch_flush_pending = True
+        if schedule:
+            self.call_in_ui(self.flush_watch_changes)
+
+    def flush_watch_changes(self):
+        with self.watch_lock:
+            self.watch_flush_pending = False
+            changes, self.watch_changes = self.watch_changes, {}
+        for key, (entry, old, new) in changes.items():
+            row = self.watch_rows.get(key)
+            if not row:
+                continue
+            bits = " ".join(str(bit) for bit in flipped_bits(old, new))
+            changed_at = datetime.fromtimestamp(entry.changed_at).strftime("%H:%M:%S.%f")[:-3]
+            self.watch_table.item(row, values=(entry.phy, f"0x{entry.reg:02X}", f"{new:04X}", bits,
+                                               entry.changes, changed_at), tags=('changed',) if bits else ())
+            if bits:
+                self.after(1000, lambda r=row, t=entry.changed_at, k=key: self.clear_watch_highlight(r, t, k))
+
+    def clear_watch_highlight(self, row, changed_at, key):
+        entry = self.watcher.entries.get(key)
+        # Only clear if nothing changed again since this highlight was set
+        if entry and entry.changed_at == changed_at and self.watch_table.exists(row):
+            self.watch_table.item(row, tags=())
 
 
     def limit_length(self, new_value, max_len):
@@ -287,53 +802,59 @@ class EthernetPHYApp(tk.Tk):
         # Extract address only
         phy_addr = phy.split(" - ")[0].strip()
 
-        command = f"READ_{phy_addr}_{reg_id}"
-        self.send_command(command)
-
-        self.reading_register = True
-        self.expected_phy_addr = phy_addr
-        self.register_poll_start_time = time.time()
-        self.after(100, self.poll_register_response)
-
-    def poll_register_response(self):
-        if not self.reading_register:
+        # Always goes to the hardware; show_cached_register() already prefilled the last value
+        try:
+            txn = self.client.submit_read(phy_addr, reg_id)
+        except ValueError:
+            self.log("Invalid Register ID format.")
             return
+        self.log(txn.command)
+        txn.add_done_callback(lambda t: self.call_in_ui(self.on_register_read, t))
 
-        if time.time() - self.register_poll_start_time > 0.5:
+    def on_register_read(self, txn):
+        try:
+            value = txn.result()
+        except TimeoutError:
             self.log("Read timeout.")
-            self.reading_register = False
             return
+        except Exception as e:
+            self.log(f"Read failed: {e}")
+            return
+        self.register_value_var.set(f"{value:04X}")
+        self.show_cache_status(txn.phy, txn.reg)
 
-        lines = self.serial_manager.read_lines()
-        if lines:
-            for line in lines:
-                self.log(line)
-
-        if line.startswith("READ_RESPONSE"):
-            parts = line.split()
-            try:
-                # Fixed: match actual values
-                phy_val = parts[2].strip()
-                reg_val = parts[4].strip()
-                value = parts[6].strip()
-
-                expected_phy = int(self.expected_phy_addr, 16 if 'x' in self.expected_phy_addr.lower() else 10)
-                actual_phy = int(phy_val)
-
-                expected_reg = int(self.register_id_entry.get().strip(), 16 if 'x' in self.register_id_entry.get().strip().lower() else 10)
-                actual_reg = int(reg_val, 16 if 'x' in reg_val.lower() else 10)
-
-                # self.log(f"Parsed → PHY: {actual_phy} vs {expected_phy}, REG: {actual_reg} vs {expected_reg}")
-
-                if actual_phy == expected_phy and actual_reg == expected_reg:
-                    self.register_value_var.set(value)
-                    self.reading_register = False
-                    return
-            except Exception as e:
-                self.log(f"Error parsing response: {e}")
-
+    def selected_register_key(self):
+        phy = self.phy_selector.get()
+        reg_id = self.register_id_entry.get().strip()
+        if not phy or not reg_id:
+            return None
+        try:
+            return parse_number(phy.split(" - ")[0]), parse_number(reg_id)
+        except ValueError:
+            return None
 
-        self.after(100, self.poll_register_response)
+    def show_cached_register(self):
+        key = self.selected_register_key()
+        if not key:
+            self.cache_status_label.config(text="")
+            return
+        entry = self.client.transactions.cache.peek(*key)
+        if entry:
+            self.register_value_var.set(f"{entry.value:04X}")
+        self.show_cache_status(*key)
+
+    def show_cache_status(self, phy, reg):
+        cache = self.client.transactions.cache
+        entry = cache.peek(phy, reg)
+        if not entry:
+            text = ""
+        elif entry.dirty:
+            text = "written, not read back"
+        else:
+            age = time.time() - entry.read_at
+            state = "cached" if cache.is_fresh(phy, reg) else "stale"
+            text = f"{state}, read {age:.1f}s ago"
+        self.cache_status_label.config(text=text)
 
 
 
@@ -348,17 +869,140 @@ class EthernetPHYApp(tk.Tk):
             self.log("Please fill in PHY, Register ID, and Hex Value.")
             return
 
+        phy_addr = phy.split(" - ")[0].strip()
         try:
-            val_int = int(hex_val, 16)
-            val_hex = f"{val_int:04X}"
+            value = int(hex_val, 16)
+            mask = int(self.write_mask_var.get().strip() or "FFFF", 16)
+            parse_number(reg_id)
         except ValueError:
-            self.log("Invalid Register ID or Hex Value format.")
+            self.log("Invalid Register ID, Hex Value or Mask format.")
             return
+        verify = bool(self.verify_write_var.get())
+        future = self.client.write_field(phy_addr, reg_id, value, mask, verify)
+        future.add_done_callback(lambda f: self.call_in_ui(self.on_register_written, f, phy_addr, reg_id, verify))
 
-        phy_addr = phy.split(" - ")[0].strip()
-        command = f"WRITE_{phy_addr}_{reg_id}_{val_hex}"
-        self.send_command(command)
+    def on_register_written(self, future, phy_addr, reg_id, verify):
+        try:
+            value = future.result()
+        except Exception as e:
+            self.log(f"Write PHY {phy_addr} REG {reg_id} failed: {e}")
+            return
+        self.log(f"Wrote PHY {phy_addr} REG {reg_id}: {value:04X}" + (" (verified)" if verify else ""))
+        self.show_cache_status(parse_number(phy_addr), parse_number(reg_id))
+
+
+    def open_dump_window(self):
+        if self.dump_window and self.dump_window.winfo_exists():
+            self.dump_window.lift()
+            return
+
+        self.dump_window = tk.Toplevel(self)
+        self.dump_window.title("Register Dump")
+        self.dump_window.geometry("420x480")
+
+        options = ttk.Frame(self.dump_window)
+        options.pack(fill='x', padx=10, pady=5)
+
+        ttk.Label(options, text="From:").pack(side='left')
+        self.dump_from_entry = ttk.Entry(options, width=6)
+        self.dump_from_entry.insert(0, "0")
+        self.dump_from_entry.pack(side='left', padx=(0, 5))
+
+        ttk.Label(options, text="To:").pack(side='left')
+        self.dump_to_entry = ttk.Entry(options, width=6)
+        self.dump_to_entry.insert(0, "31")
+        self.dump_to_entry.pack(side='left', padx=(0, 5))
+
+        self.dump_all_var = tk.IntVar(value=1)
+        ttk.Checkbutton(options, text="All PHYs", variable=self.dump_all_var).pack(side='left', padx=5)
+
+        self.dump_cache_var = tk.IntVar(value=0)
+        ttk.Checkbutton(options, text="Use cache", variable=self.dump_cache_var).pack(side='left')
+
+        ttk.Button(options, text="Run", command=self.run_dump).pack(side='left', padx=5)
+        ttk.Button(options, text="Save", command=self.save_dump).pack(side='left')
+
+        self.dump_table = ttk.Treeview(self.dump_window, columns=("phy", "reg", "value"), show='headings')
+        for column, title in (("phy", "PHY"), ("reg", "Register"), ("value", "Value")):
+            self.dump_table.heading(column, text=title)
+            self.dump_table.column(column, width=120, anchor='center')
+        self.dump_table.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+
+    def run_dump(self):
+        if self.dump_all_var.get():
+            phy_addrs = self.client.phy_addresses()
+        else:
+            phy = self.phy_selector.get()
+            phy_addrs = [phy.split(" - ")[0].strip()] if phy else []
 
+        if not phy_addrs:
+            self.log("No PHY available to dump.")
+            return
+
+        try:
+            first = parse_number(self.dump_from_entry.get())
+            last = parse_number(self.dump_to_entry.get())
+        except ValueError:
+            self.log("Invalid register range.")
+            return
+
+        self.dump_table.delete(*self.dump_table.get_children())
+        self.dump_rows = {}
+        transactions = self.client.submit_dump(phy_addrs, range(first, last + 1),
+                                               use_cache=bool(self.dump_cache_var.get()))
+        sent = sum(1 for txn in transactions if not txn.cached)
+        self.log(f"Dumping registers {first}-{last} of PHY {', '.join(phy_addrs)} ({sent} of {len(transactions)} reads sent)")
+        for txn in transactions:
+            self.dump_rows[txn] = self.dump_table.insert('', 'end', values=(txn.phy, f"0x{txn.reg:02X}", "..."))
+            txn.add_done_callback(lambda t: self.call_in_ui(self.on_dump_result, t))
+
+    def on_dump_result(self, txn):
+        row = self.dump_rows.get(txn)
+        if not row or not self.dump_table.winfo_exists():
+            return
+        try:
+            value = f"{txn.result():04X}"
+        except Exception:
+            value = "timeout"
+        self.dump_table.set(row, "value", value)
+
+    def save_dump(self):
+        rows = [self.dump_table.item(row, 'values') for row in self.dump_table.get_children()]
+        if not rows:
+            self.log("Nothing to save.")
+            return
+
+        path = filedialog.asksaveasfilename(parent=self.dump_window, defaultextension=".csv",
+                                            filetypes=self.dump_filetypes())
+        if not path:
+            return
+        if path.endswith(".npz"):
+            values = {}
+            for txn in self.dump_rows:
+                values[(txn.phy, txn.reg)] = txn.result() if txn.done() and not txn.exception() else None
+            self.save_snapshot(path, {self.serial_manager.port: values})
+            return
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["phy", "register", "value"])
+            writer.writerows(rows)
+        self.log(f"Saved {len(rows)} registers to {path}")
+
+
+    def dump_filetypes(self):
+        filetypes = [("CSV files", "*.csv")]
+        if append_snapshot:
+            filetypes.append(("Snapshot store", "*.npz"))
+        return filetypes + [("All files", "*.*")]
+
+    def save_snapshot(self, path, dumps):
+        # Appends to the store if the file exists, so repeated dumps build a time series
+        try:
+            slot = append_snapshot(path, dumps, label=datetime.now().strftime("%H:%M:%S"))
+        except (OSError, ValueError) as e:
+            self.log(f"Snapshot error: {e}")
+            return
+        self.log(f"Saved snapshot {slot} of {len(dumps)} boards to {path}")
 
     def update_bits_from_hex(self):
         try:
@@ -386,6 +1030,74 @@ class EthernetPHYApp(tk.Tk):
         self.serial_visible = not self.serial_visible
 
 
+    def save_log(self):
+        path = filedialog.asksaveasfilename(defaultextension=".log",
+                                            filetypes=[("Log files", "*.log *.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.log_sink.save(path)
+        except OSError as e:
+            self.log(f"Could not save the log: {e}")
+            return
+        self.log(f"Saved {len(self.log_sink.history)} log lines to {path}")
+
+    def toggle_capture(self):
+        capture = self.serial_manager.capture
+        if capture:
+            self.serial_manager.capture = None
+            capture.close()
+            self.record_button.config(text="Record")
+            self.log(f"Capture stopped: {capture.records} records in {capture.path}")
+            return
+
+        path = filedialog.asksaveasfilename(defaultextension=".phycap",
+                                            initialfile=datetime.now().strftime("session-%Y%m%d-%H%M%S.phycap"),
+                                            filetypes=[("PHY captures", "*.phycap"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.serial_manager.capture = CaptureWriter(path)
+        except OSError as e:
+            self.log(f"Capture error: {e}")
+            return
+        self.record_button.config(text="Stop Recording")
+        self.log(f"Recording to {path}")
+
+    def replay_capture(self):
+        path = filedialog.askopenfilename(filetypes=[("PHY captures", "*.phycap"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            reader = CaptureReader(path)
+        except (OSError, ValueError) as e:
+            self.log(f"Replay error: {e}")
+            return
+
+        def worker():
+            lines = []
+
+            def on_record(record):
+                if record.kind in (RX, TX):
+                    lines.append((f"[replay] {record.describe()}", record.time))
+                if len(lines) >= 1000:
+                    self.call_in_ui(self.log_lines, lines[:])
+                    lines.clear()
+
+            with reader:
+                client = replay(reader, on_record=on_record)
+            self.call_in_ui(self.log_lines, lines)
+            name = client.device.name if client.device else "no INFO in capture"
+            registers = len(client.transactions.cache.entries)
+            self.call_in_ui(self.log, f"Replay of {path} done: {name}, {registers} registers")
+
+        self.log(f"Replaying {path}")
+        threading.Thread(target=worker, name="replay", daemon=True).start()
+
+    def log_lines(self, lines):
+        for line, timestamp in lines:
+            self.log(line, timestamp)
+
     def connect_device(self):
         selected = self.port_combo.get()
         port = self.serial_manager.port_map.get(selected, selected)
@@ -395,19 +1107,17 @@ class EthernetPHYApp(tk.Tk):
                 self.log("No port selected")
                 return
             try:
-                self.serial_manager.connect(port)
+                self.client.connect(port)
                 self.connected = True
-                self.reading_info = True
                 self.connect_button.config(text="Disconnect")
                 self.log(f"Connected to {port}")
-                self.send_command("INFO")
-                self.after(100, self.read_info)
+                self.log("INFO")
+                future = self.client.request_info()
+                future.add_done_callback(lambda f: self.call_in_ui(self.on_device_info, f))
             except Exception as e:
                 self.log(f"Connection error: {e}")
         else:
             try:
-                if self.serial_manager.ser and self.serial_manager.ser.is_open:
-                    self.serial_manager.ser.close()
                 self.force_disconnect()
 
 
@@ -417,141 +1127,232 @@ class EthernetPHYApp(tk.Tk):
 
 
 
-    def send_command(self, cmd):
-        self.serial_manager.send(cmd)
-        self.log(f"{cmd}")
-
-    def read_info(self):
-        if not self.reading_info:
-            return
-
-        lines = self.serial_manager.read_lines()
-        if lines:
-            self.log("\n".join(lines))
-            if "END" in lines:
-                filtered_info = [line for line in lines if line not in ("INFO", "END")]
-                device_name = ""
-                device_info = {}
-                tree_info = []
-
-                self.node_functions = {}
-                current_label = None
-                pending_functions = {}
-
-                for line in filtered_info:
-                    if line.startswith("Device:"):
-                        device_name = line.replace("Device:", "").strip()
-                        current_label = device_name
-                    elif line.startswith("PHY"):
-                        tree_info.append(line)
-                        current_label = line.strip()
-                    elif line.startswith("FUNCTION:"):
-                        funcs = [f.strip() for f in line.replace("FUNCTION:", "").split(",")]
-                        if current_label:
-                            pending_functions[current_label] = funcs
-                    elif ":" in line and not line.startswith("PHY"):
-                        key, value = line.split(":", 1)
-                        device_info[key.strip().upper()] = value.strip()
-
-                self.device_info = device_info
-                self.update_tree(device_name, tree_info, pending_functions)
-                self.selected_label.config(text=device_name)
-                self.display_device_info()
-                self.status_dot.itemconfig(self.status_circle, fill="green")
-                return
-
-        self.after(100, self.read_info)
-
+    def call_function(self, func, phy_address=None, client=None):
+        # Through PhyClient.call() so the cached registers the function may change are dropped
+        client = client or self.client
+        if not client.connected:
+            self.log("Not connected.")
+            return
+        self.log(client.call(func, phy_address))
+
+    def connect_all_boards(self):
+        if self.boards is None:
+            self.boards = BoardManager()
+        primary = self.serial_manager.port if self.connected else None
+        match = self.board_match_var.get().strip() or (usb_id(primary) if primary else None)
+        if not match:
+            self.log("Connect one board first, or set Board ports in Settings to a USB VID:PID or description.")
+            return
+        ports = [port for port in board_ports(match) if port != primary and port not in self.board_nodes]
+        if not ports:
+            self.log(f"No other ports matching '{match}' to connect.")
+            return
 
+        self.log(f"Connecting {len(ports)} boards...")
+        threading.Thread(target=lambda: self.call_in_ui(self.on_boards_opened, self.boards.open(ports)),
+                         name="connect-all", daemon=True).start()
+
+    def on_boards_opened(self, boards):
+        for board in boards:
+            if board.error:
+                self.log(f"[{board.port}] Connection error: {board.error}")
+                self.boards.close(board.port)
+                continue
+            board.serial_manager.on_data = self.notify_serial_data
+            board.client.transactions.retries = self.retries_var.get()
+            self.log(f"[{board.port}] Connected to {board.name}")
+            self.add_board_node(board)
+
+    def add_board_node(self, board):
+        node = f"board:{board.port}"
+        self.board_nodes[board.port] = node
+        self.sync_device_node(node, board.device, board.client, text=f"{board.name} ({board.port})")
+
+    def close_board(self, port):
+        self.boards.close(port)
+        self.remove_tree_node(self.board_nodes.pop(port, ""))
+
+    def dump_all_boards(self):
+        boards = self.boards.connected_boards() if self.boards else []
+        if self.connected:
+            boards = [("", self.client)] + [(board.port, board.client) for board in boards]
+        else:
+            boards = [(board.port, board.client) for board in boards]
+        if not boards:
+            self.log("No boards connected.")
+            return
 
+        def worker():
+            # Queue every board's dump before collecting, so all links transfer in parallel
+            pending = [(port or self.serial_manager.port, client.submit_dump()) for port, client in boards]
+            dumps = {}
+            for port, transactions in pending:
+                values = dumps.setdefault(port, {})
+                for txn in transactions:
+                    try:
+                        values[(txn.phy, txn.reg)] = txn.wait()
+                    except Exception:
+                        values[(txn.phy, txn.reg)] = None
+            self.call_in_ui(self.save_board_dump, dumps)
+
+        self.log(f"Dumping {len(boards)} boards...")
+        threading.Thread(target=worker, name="dump-all", daemon=True).start()
+
+    def save_board_dump(self, dumps):
+        rows = [(port, phy, f"0x{reg:02X}", f"{value:04X}" if value is not None else "timeout")
+                for port, values in dumps.items() for (phy, reg), value in sorted(values.items())]
+        self.log(f"Dump complete: {len(rows)} registers")
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=self.dump_filetypes())
+        if not path:
+            return
+        if path.endswith(".npz"):
+            self.save_snapshot(path, dumps)
+            return
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["port", "phy", "register", "value"])
+            writer.writerows(rows)
+        self.log(f"Saved {len(rows)} registers to {path}")
+
+    def on_device_info(self, future):
+        if future.cancelled() or future.exception() or not self.connected:
+            return
 
+        self.device = future.result()
+        self.device_info = self.device.properties
+        self.update_tree(self.device)
+        self.selected_label.config(text=self.device.name)
+        self.display_device_info()
+        self.status_dot.itemconfig(self.status_circle, fill="green")
 
+        raise_baudrate = self.raise_baud_var.get()
 
+        def negotiate():
+            if self.client.enable_binary():
+                self.call_in_ui(self.log, "Binary framing enabled")
+            if not raise_baudrate:
+                return
+            baudrate = self.client.serial_manager.baudrate
+            if self.client.negotiate_baudrate() != baudrate:
+                self.call_in_ui(self.log, f"Baud rate raised to {self.client.serial_manager.baudrate}")
 
-    def log(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        for console in [getattr(self, 'console_home', None), getattr(self, 'console_register', None)]:
-            if console:
-                console['state'] = 'normal'
-                console.insert('end', f"[{timestamp}] {message}\n")
-                console['state'] = 'disabled'
-                console.see('end')
+        threading.Thread(target=negotiate, name="negotiate", daemon=True).start()
 
 
-    def update_tree(self, device_name, tree_lines, function_map):
-        self.tree.delete(*self.tree.get_children())
-        self.node_functions.clear()
-        self.phy_addresses = {}
 
-        device_node = self.tree.insert('', 'end', text=device_name, open=True)
-        self.device_id = device_node
-        self.node_functions[device_node] = function_map.get(device_name, [])
 
-        phy_display_list = []
 
-        for line in tree_lines:
-            phy_address = ""
-            phy_name = line
-            for prefix in ("PHY1:", "PHY2:"):
-                if line.startswith(prefix):
-                    parts = line.split("-", 1)
-                    if len(parts) == 2:
-                        phy_address = parts[0].split(":")[1].strip()
-                        phy_name = parts[1].strip()
-            display_text = f"{phy_address} - {phy_name}" if phy_address else phy_name
-            phy_id = self.tree.insert(device_node, 'end', text=phy_name)
-            self.node_functions[phy_id] = function_map.get(line.strip(), [])
-            if phy_address:
-                self.phy_addresses[phy_id] = phy_address
-            phy_display_list.append(display_text)
 
-        self.phy_selector['values'] = phy_display_list
-        if phy_display_list:
-            self.phy_selector.current(0)
 
+    def log(self, message, timestamp=None):
+        moment = datetime.fromtimestamp(timestamp) if timestamp else datetime.now()
+        timestamp = moment.strftime("%H:%M:%S.%f")[:-3]
+        self.log_sink.write(f"[{timestamp}] {message}\n")
 
 
+    def remove_tree_node(self, node):
+        if not node or not self.tree.exists(node):
+            return
+        for item in (node,) + self.tree.get_children(node):
+            self.node_actions.pop(item, None)
+            self.drop_panel(item)
+        self.tree.delete(node)
+
+    def set_offline(self, node):
+        if self.tree.exists(node):
+            for item in (node,) + self.tree.get_children(node):
+                self.tree.item(item, tags=('offline',))
+
+    def set_node_actions(self, node, functions, phy_address, client):
+        actions = (tuple(functions), phy_address, client)
+        if self.node_actions.get(node) != actions:
+            self.node_actions[node] = actions
+            self.drop_panel(node)
+
+    def drop_panel(self, node):
+        panel = self.node_panels.pop(node, None)
+        if panel is None:
+            return
+        if panel is self.active_panel:
+            self.active_panel = None
+        panel.destroy()
 
+    def sync_tree_item(self, parent, node, index, text):
+        if not self.tree.exists(node):
+            self.tree.insert(parent, index, iid=node, text=text, open=True)
+            return
+        if self.tree.item(node, 'text') != text:
+            self.tree.item(node, text=text)
+        if self.tree.item(node, 'tags'):
+            self.tree.item(node, tags=())
+
+    def sync_device_node(self, node, device, client=None, text=None, index='end'):
+        # Reconciles one device's items with its parsed INFO. PHY items are keyed by
+        # position, so an unchanged device touches nothing and a changed one only updates,
+        # adds or removes the items that differ.
+        self.sync_tree_item('', node, index, text or device.name)
+        self.set_node_actions(node, device.functions, None, client)
+
+        for position, phy in enumerate(device.phys):
+            phy_id = f"{node}/{position}"
+            self.sync_tree_item(node, phy_id, position, phy.name)
+            self.set_node_actions(phy_id, phy.functions, phy.address, client)
+        for phy_id in self.tree.get_children(node)[len(device.phys):]:
+            self.remove_tree_node(phy_id)
+
+    def update_tree(self, device):
+        # Only the primary device is reconciled; nodes of boards opened with "Connect All" stay
+        self.sync_device_node(self.device_id, device, self.client, index=0)
+
+        phy_display_list = [phy.display_text for phy in device.phys]
+        if list(self.phy_selector['values']) != phy_display_list:
+            self.phy_selector['values'] = phy_display_list
+            if phy_display_list:
+                self.phy_selector.current(0)
+        elif phy_display_list and not self.phy_selector.get():
+            self.phy_selector.current(0)
 
+    def node_panel(self, node):
+        panel = self.node_panels.get(node)
+        if panel is None:
+            functions, phy_address, client = self.node_actions.get(node, ((), None, None))
+            panel = ttk.Frame(self.interaction_frame)
+            for func in functions:
+                ttk.Button(panel, text=func,
+                           command=lambda f=func: self.call_function(f, phy_address, client)).pack(side='left', padx=5)
+            self.node_panels[node] = panel
+        return panel
 
     def on_tree_select(self, event):
         selected_item = self.tree.selection()
-        if selected_item:
-            item_id = selected_item[0]
-            item_text = self.tree.item(item_id, 'text')
-            self.selected_label.config(text=item_text)
-
-            parent = self.tree.parent(item_id)
-            if parent == '':
-                self.display_device_info()
-            else:
-                self.speed_label.config(text="")
-
-            # Clear old buttons
-            for widget in self.button_frame.winfo_children():
-                widget.destroy()
-
-            # Add new buttons based on functions
-            for func in self.node_functions.get(item_id, []):
-                if parent == '':  # device-level
-                    command = f"DEV_{func.upper().replace(' ', '_')}"
-                else:  # PHY-level
-                    addr = self.phy_addresses.get(item_id, "")
-                    command = f"{addr}_{func.upper().replace(' ', '_')}"
-                btn = ttk.Button(self.button_frame, text=func, command=lambda c=command: self.send_command(c))
-                btn.pack(side='left', padx=5)
-
-
-
+        if not selected_item:
+            return
+        item_id = selected_item[0]
+        self.selected_label.config(text=self.tree.item(item_id, 'text'))
 
-    def display_device_info(self):
+        client = self.node_actions.get(item_id, ((), None, None))[2]
+        if self.tree.parent(item_id) == '':
+            self.display_device_info(client.device.properties if client and client.device else None)
+        else:
+            self.speed_label.config(text="")
+
+        # Swap in the node's cached button panel instead of rebuilding its buttons
+        panel = self.node_panel(item_id)
+        if panel is not self.active_panel:
+            if self.active_panel is not None:
+                self.active_panel.pack_forget()
+            panel.pack(pady=5)
+            self.active_panel = panel
+
+    def display_device_info(self, device_info=None):
+        device_info = self.device_info if device_info is None else device_info
         info_lines = []
-        if "CONTROLLER" in self.device_info:
-            info_lines.append(f"Controller: {self.device_info['CONTROLLER']}")
-        if "SOFTWARE VERSION" in self.device_info:
-            info_lines.append(f"Software: {self.device_info['SOFTWARE VERSION']}")
-        if "SPEED" in self.device_info:
-            info_lines.append(f"Speed: {self.device_info['SPEED']}")
+        if "CONTROLLER" in device_info:
+            info_lines.append(f"Controller: {device_info['CONTROLLER']}")
+        if "SOFTWARE VERSION" in device_info:
+            info_lines.append(f"Software: {device_info['SOFTWARE VERSION']}")
+        if "SPEED" in device_info:
+            info_lines.append(f"Speed: {device_info['SPEED']}")
         self.speed_label.config(text="\n".join(info_lines))
 
 
@@ -0,0 +1,237 @@
+import threading
+import time
+
+from transactions import parse_number
+
+# Clause 22 registers used for Clause 45 indirect (MMD) access
+MMD_CTRL = 13
+MMD_DATA = 14
+MMD_FUNCTION_DATA = 0x4000  # MMDCTRL function bits 15:14 = 01, data without post-increment
+
+SCRIPT_HELP = """\
+# One operation per line. PHY and register numbers are decimal unless written 0x..;
+# values and masks are always hex.
+#   read <phy> <reg>
+#   write <phy> <reg> <value>
+#   rmw <phy> <reg> <mask> <value>          masked read-modify-write
+#   c45read <phy> <mmd> <reg>               Clause 45 via registers 13/14
+#   c45write <phy> <mmd> <reg> <value>
+#   wait <ms>
+#   poll <phy> <reg> <bit> <0|1> [timeout_ms]
+"""
+
+ARGUMENT_COUNTS = {
+    "read": (2, 2),
+    "write": (3, 3),
+    "rmw": (4, 4),
+    "c45read": (3, 3),
+    "c45write": (4, 4),
+    "wait": (1, 1),
+    "poll": (4, 5),
+}
+
+# Operations that need everything before them to have completed
+BARRIERS = {"wait", "poll"}
+
+
+class ScriptError(ValueError):
+    def __init__(self, line_no, message):
+        super().__init__(f"line {line_no}: {message}")
+        self.line_no = line_no
+
+
+class Step:
+    def __init__(self, kind, args, text, line_no):
+        self.kind = kind
+        self.args = args
+        self.text = text
+        self.line_no = line_no
+
+    def operations(self):
+        if self.kind == "read":
+            phy, reg = self.args
+            return [("read", phy, reg)]
+        if self.kind == "write":
+            phy, reg, value = self.args
+            return [("write", phy, reg, value)]
+        if self.kind == "rmw":
+            phy, reg = self.args[:2]
+            return [("read", phy, reg)]
+        if self.kind == "c45read":
+            phy, mmd, reg = self.args
+            return mmd_select(phy, mmd, reg) + [("read", phy, MMD_DATA)]
+        if self.kind == "c45write":
+            phy, mmd, reg, value = self.args
+            return mmd_select(phy, mmd, reg) + [("write", phy, MMD_DATA, value)]
+        return []
+
+
+class StepResult:
+    def __init__(self, step, value=None, error=None, detail=""):
+        self.step = step
+        self.value = value
+        self.error = error
+        self.detail = detail
+
+    @property
+    def text(self):
+        if self.error:
+            return self.error
+        if self.detail:
+            return self.detail
+        return f"{self.value:04X}" if self.value is not None else "ok"
+
+
+def mmd_select(phy, mmd, reg):
+    return [("write", phy, MMD_CTRL, mmd),
+            ("write", phy, MMD_DATA, reg),
+            ("write", phy, MMD_CTRL, MMD_FUNCTION_DATA | mmd)]
+
+
+def parse_hex(text):
+    return int(text, 16)
+
+
+def check_arguments(words, line_no, counts=ARGUMENT_COUNTS):
+    # Shared with plan_runner, whose steps take the same arguments minus the PHY address
+    kind = words[0].lower()
+    if kind not in counts:
+        raise ScriptError(line_no, f"unknown operation '{words[0]}'")
+    low, high = counts[kind]
+    if not low <= len(words) - 1 <= high:
+        raise ScriptError(line_no, f"{kind} takes {low if low == high else f'{low}-{high}'} arguments")
+
+
+def parse_step(line, line_no):
+    words = line.split()
+    kind = words[0].lower()
+    args = words[1:]
+    check_arguments(words, line_no)
+
+    try:
+        if kind == "wait":
+            parsed = [parse_number(args[0])]
+        elif kind == "poll":
+            parsed = [args[0], parse_number(args[1]), parse_number(args[2]), parse_number(args[3]),
+                      parse_number(args[4]) if len(args) > 4 else 1000]
+        elif kind in ("read", "write", "rmw"):
+            parsed = [args[0], parse_number(args[1])] + [parse_hex(arg) for arg in args[2:]]
+        else:
+            parsed = [args[0], parse_number(args[1]), parse_number(args[2])] + [parse_hex(arg) for arg in args[3:]]
+        if kind != "wait":
+            parse_number(parsed[0])  # validate the PHY address up front
+    except ValueError:
+        raise ScriptError(line_no, f"invalid number in '{line}'")
+
+    return Step(kind, parsed, line, line_no)
+
+
+def parse_script(text, parse=parse_step):
+    steps = []
+    for line_no, raw in enumerate(text.splitlines(), 1):
+        line = raw.split("#", 1)[0].strip()
+        if line:
+            steps.append(parse(line, line_no))
+    return steps
+
+
+class ScriptRunner:
+    # Runs a parsed script with as few round-trips as possible: every operation between two
+    # barriers is sent as one pipelined batch, and read-modify-write write-backs ride at the
+    # front of the following batch. A read-modify-write is reported once its write-back is done.
+    def __init__(self, client, timeout=None, poll_interval=0.01):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval  # seconds between the reads of a poll
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, steps, on_result=None):
+        results = []
+        batch = []
+        carry = []
+
+        def emit(result):
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        for step in steps:
+            if self.stop_event.is_set():
+                break
+            if step.kind in BARRIERS:
+                carry = self.flush(batch, carry, emit)
+                batch = []
+                emit(self.run_barrier(step))
+                continue
+            batch.append(step)
+            if step.kind == "rmw":
+                carry = self.flush(batch, carry, emit)
+                batch = []
+
+        self.flush(batch, carry, emit)
+        return results
+
+    def flush(self, batch, carry, emit):
+        # carry: (step, old value, new value) of the read-modify-writes whose write-back goes first
+        if not batch and not carry:
+            return []
+        operations = [("write", step.args[0], step.args[1], new_value) for step, _, new_value in carry]
+        spans = []
+        for step in batch:
+            step_ops = step.operations()
+            spans.append((step, len(operations), len(step_ops)))
+            operations.extend(step_ops)
+
+        transactions = self.client.batch(operations, self.timeout)
+
+        for (step, value, new_value), txn in zip(carry, transactions):
+            try:
+                txn.wait()
+            except Exception as e:
+                emit(StepResult(step, error=f"error: write-back of {new_value:04X} failed: {e}"))
+                continue
+            emit(StepResult(step, value=new_value, detail=f"{value:04X} -> {new_value:04X}"))
+
+        next_carry = []
+        for step, start, count in spans:
+            last = transactions[start + count - 1]
+            try:
+                value = last.wait()
+            except Exception as e:
+                emit(StepResult(step, error=f"error: {e}"))
+                continue
+
+            if step.kind == "rmw":
+                mask, bits = step.args[2:]
+                new_value = (value & ~mask & 0xFFFF) | (bits & mask)
+                next_carry.append((step, value, new_value))
+            elif step.kind in ("read", "c45read"):
+                emit(StepResult(step, value=value))
+            else:
+                emit(StepResult(step))
+        return next_carry
+
+    def run_barrier(self, step):
+        if step.kind == "wait":
+            if self.stop_event.wait(step.args[0] / 1000):
+                return StepResult(step, error="stopped")
+            return StepResult(step, detail=f"waited {step.args[0]} ms")
+
+        phy, reg, bit, expected, timeout_ms = step.args
+        deadline = time.time() + timeout_ms / 1000
+        attempts = 0
+        while not self.stop_event.is_set():
+            attempts += 1
+            try:
+                value = self.client.read(phy, reg, timeout=self.timeout)
+            except Exception as e:
+                return StepResult(step, error=f"error: {e}")
+            if (value >> bit) & 1 == expected:
+                return StepResult(step, value=value, detail=f"{value:04X} after {attempts} reads")
+            if time.time() >= deadline:
+                return StepResult(step, value=value, error=f"timeout, last {value:04X}")
+            self.stop_event.wait(min(self.poll_interval, max(0.0, deadline - time.time())))
+        return StepResult(step, error="stopped")
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RttEstimator:
+    # Retransmission timeout the way TCP computes it (RFC 6298): smoothed RTT plus four
+    # mean deviations, so the timeout follows the link instead of a fixed guess. It never
+    # drops below minimum (the initial timeout unless given), so a firmware stall of a few
+    # hundred milliseconds is waited out rather than retried. A timeout doubles it, and it
+    # stays doubled until a command completes without having been retried (Karn). Several
+    # commands of one burst timing out together count as one timeout, like TCP's single timer.
+    def __init__(self, initial, minimum=None, maximum=5.0):
+        self.initial = initial
+        self.minimum = initial if minimum is None else minimum
+        self.maximum = maximum
+        self.srtt = None
+        self.rttvar = None
+        self.backoff = 1
+        self.backed_off_at = None
+
+    def back_off(self):
+        now = time.monotonic()
+        if self.backed_off_at is not None and now - self.backed_off_at < self.timeout:
+            return
+        self.backed_off_at = now
+        if self.timeout < self.maximum:
+            self.backoff *= 2
+
+    def reset_backoff(self):
+        self.backoff = 1
+        self.backed_off_at = None
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    @property
+    def timeout(self):
+        base = self.initial if self.srtt is None else max(self.minimum, self.srtt + 4 * self.rttvar)
+        return min(self.maximum, base * self.backoff)
+
+
+class LatencyStats:
+    def __init__(self, initial_timeout, window):
+        self.samples = deque(maxlen=window)  # rolling window of end-to-end latencies
+        self.count = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.rto = RttEstimator(initial_timeout)
+        self.item_time = None  # how long each extra command in a burst adds, smoothed
+
+    def summary(self):
+        summary = {"count": self.count, "timeouts": self.timeouts, "retries": self.retries,
+                   "timeout_ms": self.rto.timeout * 1000}
+        samples = list(self.samples)
+        if samples:
+            summary.update(p50_ms=percentile(samples, 0.50) * 1000, p95_ms=percentile(samples, 0.95) * 1000,
+                           p99_ms=percentile(samples, 0.99) * 1000)
+        return summary
+
+
+class LatencyMetrics:
+    # Latency per command kind (READ, WRITE, INFO, ...) for one port. Every completed
+    # command lands in the rolling histogram; only commands that did not wait behind
+    # others in a burst, and were not retried, feed the timeout estimate (Karn's rule).
+    def __init__(self, initial_timeout=0.5, window=1000, item_time=0.01):
+        self.initial_timeout = initial_timeout
+        self.window = window
+        self.default_item_time = item_time
+        self.kinds = {}
+        self.lock = threading.Lock()
+
+    def stats(self, kind):
+        stats = self.kinds.get(kind)
+        if stats is None:
+            with self.lock:
+                stats = self.kinds.setdefault(kind, LatencyStats(self.initial_timeout, self.window))
+        return stats
+
+    def record(self, kind, latency, position=0, retried=False):
+        stats = self.stats(kind)
+        stats.samples.append(latency)
+        stats.count += 1
+        if retried:
+            return
+        stats.rto.reset_backoff()
+        if position == 0:
+            stats.rto.sample(latency)
+        elif stats.rto.srtt is not None:
+            # Whatever the burst added on top of a lone round trip, spread over the commands ahead
+            item_time = max(0.0, latency - stats.rto.srtt) / position
+            stats.item_time = item_time if stats.item_time is None else 0.875 * stats.item_time + 0.125 * item_time
+
+    def record_timeout(self, kind):
+        stats = self.stats(kind)
+        stats.timeouts += 1
+        stats.rto.back_off()
+
+    def record_retry(self, kind):
+        stats = self.stats(kind)
+        stats.retries += 1
+        stats.rto.back_off()
+
+    def timeout(self, kind, position=0):
+        # Time to allow a command that has position others ahead of it in the same burst
+        stats = self.stats(kind)
+        item_time = stats.item_time if stats.item_time is not None else self.default_item_time
+        return stats.rto.timeout + position * item_time * 2
+
+    def summary(self):
+        with self.lock:
+            kinds = dict(self.kinds)
+        return {kind: stats.summary() for kind, stats in sorted(kinds.items())}
+
+    def reset(self):
+        with self.lock:
+            self.kinds = {}
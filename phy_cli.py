@@ -0,0 +1,216 @@
+import argparse
+import csv
+import sys
+import time
+
+import serial.tools.list_ports
+
+from capture import CaptureWriter
+from mdio_script import ScriptError
+from phy_client import PhyClient
+from plan_runner import PlanRunner, parse_plan, plan_summary
+from serial_manager import PORT_ERRORS
+from transactions import parse_number
+
+try:
+    from snapshots import append_snapshot
+except ImportError:  # numpy is optional and only needed for --snapshot
+    append_snapshot = None
+
+
+def parse_range(text):
+    if "-" in text:
+        first, last = text.split("-", 1)
+        return range(parse_number(first), parse_number(last) + 1)
+    reg = parse_number(text)
+    return range(reg, reg + 1)
+
+
+def cmd_ports(client, args):
+    for port in serial.tools.list_ports.comports():
+        print(f"{port.device}\t{port.description}")
+
+
+def cmd_info(client, args):
+    device = client.info(timeout=args.timeout)
+    print(f"Device: {device.name}")
+    for key, value in device.properties.items():
+        print(f"{key}: {value}")
+    if device.functions:
+        print(f"FUNCTION: {', '.join(device.functions)}")
+    for phy in device.phys:
+        print(phy.label)
+        if phy.functions:
+            print(f"  FUNCTION: {', '.join(phy.functions)}")
+
+
+def cmd_read(client, args):
+    value = client.read(args.phy, args.reg, timeout=args.timeout)
+    print(f"{value:04X}")
+
+
+def cmd_write(client, args):
+    future = client.write_field(args.phy, args.reg, int(args.value, 16), int(args.mask, 16), args.verify)
+    client.writes.flush()
+    try:
+        print(f"{future.result():04X}")
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+def cmd_dump(client, args):
+    if args.phy:
+        phy_addrs = args.phy
+    else:
+        client.info(timeout=args.timeout)
+        phy_addrs = client.phy_addresses()
+
+    results = client.dump(phy_addrs, parse_range(args.range))
+    if args.snapshot:
+        if append_snapshot is None:
+            print("error: --snapshot needs numpy", file=sys.stderr)
+            return 2
+        append_snapshot(args.snapshot, {args.port: results}, label=args.label or "")
+    writer = csv.writer(sys.stdout) if args.csv else None
+    if writer:
+        writer.writerow(["phy", "register", "value"])
+    for (phy, reg), value in sorted(results.items()):
+        text = f"{value:04X}" if value is not None else "timeout"
+        if writer:
+            writer.writerow([phy, f"0x{reg:02X}", text])
+        else:
+            print(f"PHY {phy} REG 0x{reg:02X}: {text}")
+    if any(value is None for value in results.values()):
+        return 1
+
+
+def cmd_call(client, args):
+    print(client.call(args.function, args.phy))
+
+
+def cmd_plan(client, args):
+    try:
+        with open(args.plan) as f:
+            steps = parse_plan(f.read())
+    except (OSError, ScriptError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if args.phy:
+        phy_addrs = args.phy
+    else:
+        client.info(timeout=args.timeout)
+        phy_addrs = client.phy_addresses()
+
+    writer = csv.writer(sys.stdout) if args.csv else None
+    if writer:
+        writer.writerow(["phy", "line", "step", "result", "status"])
+
+    def report(result):
+        status = "FAIL" if result.error else "ok"
+        phy = result.phy if result.phy is not None else "board"
+        if writer:
+            writer.writerow([phy, result.step.line_no, result.step.text, result.text, status])
+        else:
+            print(f"{phy}\t{result.step.line_no}\t{result.step.text}: {result.text}")
+
+    start = time.perf_counter()
+    results = PlanRunner(client).run(steps, phy_addrs, on_result=report)
+    elapsed = time.perf_counter() - start
+    failures = 0
+    for phy, (count, failed) in plan_summary(results, phy_addrs).items():
+        failures += failed
+        print(f"PHY {phy}: {'FAIL' if failed else 'PASS'} ({count} steps, {failed} failed)", file=sys.stderr)
+    print(f"{len(phy_addrs)} PHYs in {elapsed:.2f} s", file=sys.stderr)
+    if failures:
+        return 1
+
+
+COMMANDS = {
+    "ports": cmd_ports,
+    "info": cmd_info,
+    "read": cmd_read,
+    "write": cmd_write,
+    "dump": cmd_dump,
+    "call": cmd_call,
+    "plan": cmd_plan,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless Ethernet PHY Manager client")
+    parser.add_argument("-p", "--port", help="serial port, e.g. /dev/ttyUSB0 or COM3")
+    parser.add_argument("-b", "--baudrate", type=int, default=115200)
+    parser.add_argument("-t", "--timeout", type=float, default=2.0, help="seconds to wait for a response")
+    parser.add_argument("--binary", action="store_true", help="use binary framing if the firmware supports it")
+    parser.add_argument("--max-baudrate", type=int, default=None,
+                        help="switch to the fastest rate the firmware offers, up to this one")
+    parser.add_argument("--capture", help="record the session to this capture file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("ports", help="list serial ports")
+    sub.add_parser("info", help="query the device description")
+
+    read = sub.add_parser("read", help="read one register")
+    read.add_argument("phy")
+    read.add_argument("reg")
+
+    write = sub.add_parser("write", help="write one register (value in hex)")
+    write.add_argument("phy")
+    write.add_argument("reg")
+    write.add_argument("value")
+    write.add_argument("--mask", default="FFFF", help="only change these bits (hex); the rest are read first")
+    write.add_argument("--verify", action="store_true", help="read the register back and compare")
+
+    dump = sub.add_parser("dump", help="read a register range from one or all PHYs")
+    dump.add_argument("--phy", action="append", help="PHY address (repeatable, default: all PHYs from INFO)")
+    dump.add_argument("--range", default="0-31", help="register range, e.g. 0-31 or 0x10-0x1F")
+    dump.add_argument("--csv", action="store_true", help="print CSV instead of text")
+    dump.add_argument("--snapshot", help="also append the dump to this snapshot store (.npz)")
+    dump.add_argument("--label", help="label for the snapshot, e.g. the temperature step")
+
+    call = sub.add_parser("call", help="invoke a device or PHY function")
+    call.add_argument("function")
+    call.add_argument("--phy", help="PHY address; omit for a device-level function")
+
+    plan = sub.add_parser("plan", help="run a test plan on all PHYs at once")
+    plan.add_argument("plan", help="plan file, see plan_runner.PLAN_HELP")
+    plan.add_argument("--phy", action="append", help="PHY address (repeatable, default: all PHYs from INFO)")
+    plan.add_argument("--csv", action="store_true", help="print CSV instead of text")
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command != "ports" and not args.port:
+        print("error: --port is required", file=sys.stderr)
+        return 2
+
+    client = PhyClient()
+    try:
+        if args.command != "ports":
+            if args.capture:
+                client.serial_manager.capture = CaptureWriter(args.capture)
+            client.connect(args.port, args.baudrate)
+            if args.binary or args.max_baudrate:
+                client.info(timeout=args.timeout)
+                if args.max_baudrate:
+                    client.negotiate_baudrate(args.max_baudrate)
+                if args.binary:
+                    client.enable_binary()
+        return COMMANDS[args.command](client, args) or 0
+    except TimeoutError:
+        print("error: timed out waiting for the device", file=sys.stderr)
+        return 1
+    except PORT_ERRORS + (ConnectionError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.disconnect()
+        if client.serial_manager.capture:
+            client.serial_manager.capture.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from binary_protocol import MODE_ACK, MODE_COMMAND, supports_binary
+from response_parser import InfoComplete, parse_number
+from serial_manager import PORT_ERRORS, SerialManager
+from write_queue import WriteQueue
+
+# Baud rate negotiation, offered by firmware that lists "Baudrates: ..." in INFO. The host
+# asks for a rate with BAUD_<rate>; the firmware acknowledges at the old rate and switches.
+# It keeps the new rate only if BAUD_CONFIRM arrives at that rate within BAUD_FALLBACK
+# seconds, so a failed switch leaves both ends back at the old rate.
+BAUD_CONFIRM = "BAUD_CONFIRM"
+BAUD_CONFIRM_ACK = "BAUD_CONFIRM OK"
+BAUD_FALLBACK = 1.0
+
+
+def supported_baudrates(device):
+    rates = device.properties.get("BAUDRATES", "") if device else ""
+    return sorted(int(rate) for rate in rates.replace(",", " ").split() if rate.isdigit())
+
+
+def function_command(func, phy_addr=None):
+    name = func.upper().replace(' ', '_')
+    return f"DEV_{name}" if phy_addr is None else f"{phy_addr}_{name}"
+
+
+class PhyClient:
+    def __init__(self, serial_manager=None):
+        self.serial_manager = serial_manager or SerialManager()
+        self.transactions = self.serial_manager.transactions
+        self.writes = WriteQueue(self.transactions)
+        self.device = None
+        self.info_future = None
+        self.info_sent_at = None
+        self.initial_baudrate = None  # the rate connect() opened at, restored on disconnect
+        self.lock = threading.Lock()
+        self.serial_manager.add_event_listener(self.handle_event)
+
+    @property
+    def connected(self):
+        ser = self.serial_manager.ser
+        return bool(ser and ser.is_open)
+
+    def connect(self, port, baudrate=115200, reader=True):
+        self.serial_manager.connect(port, baudrate, reader)
+        self.initial_baudrate = baudrate
+
+    def disconnect(self):
+        with self.lock:
+            future, self.info_future = self.info_future, None
+        if future and not future.done():
+            future.set_exception(ConnectionError("Serial port closed"))
+        self.restore_baudrate()
+        self.serial_manager.disconnect()
+        self.device = None
+
+    def send(self, command):
+        self.serial_manager.send(command)
+
+    def expect_line(self, predicate):
+        # Future for the next received line matching predicate; cancel it to stop waiting
+        future = Future()
+
+        def listener(line):
+            if predicate(line) and not future.done():
+                future.set_result(line)
+
+        self.serial_manager.add_listener(listener)
+        future.add_done_callback(lambda f: self.serial_manager.remove_listener(listener))
+        return future
+
+    def enable_binary(self, timeout=0.5):
+        # Switch register access to binary frames if the firmware advertised support in INFO;
+        # older firmware keeps using the text protocol
+        if self.serial_manager.binary:
+            return True
+        if not supports_binary(self.device):
+            return False
+        ack = self.expect_line(lambda line: line == MODE_ACK)
+        self.serial_manager.send(MODE_COMMAND)
+        try:
+            ack.result(timeout=timeout)
+        except TimeoutError:
+            ack.cancel()
+            return False
+        self.serial_manager.set_binary(True)
+        return True
+
+    def negotiate_baudrate(self, max_rate=None, timeout=0.5):
+        # Moves the link to the fastest rate both ends support, trying slower ones if a switch
+        # fails. Returns the rate in use afterwards.
+        current = self.serial_manager.baudrate
+        rates = [rate for rate in supported_baudrates(self.device)
+                 if rate > current and (not max_rate or rate <= max_rate)]
+        for rate in reversed(rates):
+            if self.switch_baudrate(rate, timeout):
+                return rate
+        return current
+
+    def switch_baudrate(self, rate, timeout=0.5):
+        ack = self.expect_line(lambda line: line == f"BAUD_{rate} OK")
+        self.serial_manager.send(f"BAUD_{rate}")
+        try:
+            ack.result(timeout=timeout)
+        except TimeoutError:
+            ack.cancel()
+            return False
+
+        old = self.serial_manager.baudrate
+        self.serial_manager.set_baudrate(rate)
+        confirmed = self.expect_line(lambda line: line == BAUD_CONFIRM_ACK)
+        self.serial_manager.send(BAUD_CONFIRM)
+        try:
+            confirmed.result(timeout=timeout)
+        except TimeoutError:
+            confirmed.cancel()
+            self.serial_manager.set_baudrate(old)
+            time.sleep(BAUD_FALLBACK)  # until the firmware has given up on the new rate too
+            return False
+        return True
+
+    def restore_baudrate(self, timeout=0.5):
+        # The next session opens at the initial rate, so a negotiated rate must not outlive
+        # this one. Skipped when the port is already gone.
+        rate = self.initial_baudrate
+        if not rate or self.serial_manager.baudrate in (None, rate) or self.serial_manager.reader_error:
+            return True
+        try:
+            return self.switch_baudrate(rate, timeout)
+        except PORT_ERRORS:
+            return False
+
+    def request_info(self):
+        future = Future()
+        with self.lock:
+            self.info_future = future
+            self.info_sent_at = time.time()
+        self.serial_manager.send("INFO")
+        return future
+
+    def info(self, timeout=2.0):
+        return self.request_info().result(timeout=timeout)
+
+    def handle_event(self, event):
+        # Runs on the reader thread once the parser has seen a whole INFO block
+        if not isinstance(event, InfoComplete):
+            return
+        self.device = event.device
+        with self.lock:
+            future, self.info_future = self.info_future, None
+            sent_at, self.info_sent_at = self.info_sent_at, None
+        if sent_at:
+            self.transactions.metrics.record("INFO", time.time() - sent_at)
+        if future and not future.done():
+            future.set_result(event.device)
+
+    def phy_addresses(self):
+        return self.device.phy_addresses if self.device else []
+
+    def submit_read(self, phy_addr, reg_id, timeout=None, use_cache=False):
+        return self.transactions.read(phy_addr, reg_id, timeout, use_cache)
+
+    def read(self, phy_addr, reg_id, timeout=None, use_cache=False):
+        return self.submit_read(phy_addr, reg_id, timeout, use_cache).wait()
+
+    def write(self, phy_addr, reg_id, value):
+        return self.batch([("write", phy_addr, reg_id, value)])[0]
+
+    def batch(self, operations, timeout=None):
+        # Direct operations, sent as one burst behind any queued write to the registers they write
+        written = {(parse_number(op[1]), parse_number(op[2])) for op in operations if op[0] == "write"}
+        if written:
+            self.writes.flush_registers(written)
+        return self.transactions.batch(operations, timeout)
+
+    def write_field(self, phy_addr, reg_id, value, mask=0xFFFF, verify=None):
+        # Queued write of the bits in mask; see WriteQueue. Returns a Future
+        return self.writes.write(phy_addr, reg_id, value, mask, verify)
+
+    def submit_dump(self, phy_addrs=None, registers=range(32), timeout=None, use_cache=False):
+        if phy_addrs is None:
+            phy_addrs = self.phy_addresses()
+        return self.transactions.dump(phy_addrs, registers, timeout, use_cache)
+
+    def dump(self, phy_addrs=None, registers=range(32), timeout=None, use_cache=False):
+        if phy_addrs is None:
+            phy_addrs = self.phy_addresses()
+        return self.transactions.dump_values(phy_addrs, registers, timeout, use_cache)
+
+    def latency(self):
+        # {kind: {count, p50_ms, p95_ms, p99_ms, timeouts, retries, timeout_ms}} for this port
+        return self.transactions.metrics.summary()
+
+    def call(self, func, phy_addr=None):
+        # A function (reset, loopback, ...) can change any register of the PHY, or of every
+        # PHY for a device-level one, so their cached values are no longer trustworthy
+        command = function_command(func, phy_addr)
+        self.transactions.cache.invalidate(None if phy_addr is None else parse_number(phy_addr))
+        self.serial_manager.send(command)
+        return command
+
+    def find_phy(self, phy_addr):
+        if not self.device:
+            return None
+        wanted = parse_number(phy_addr)
+        for phy in self.device.phys:
+            if phy.address and parse_number(phy.address) == wanted:
+                return phy
+        return None
@@ -0,0 +1,287 @@
+import argparse
+import os
+import random
+import select
+import string
+import sys
+import threading
+import time
+import tty
+
+from binary_protocol import (MODE_ACK, MODE_COMMAND, OP_ERROR, OP_READ, OP_RESPONSE, OP_WRITE, PROTOCOL_NAME,
+                             SYNC, encode_frame, extract_frames)
+from transactions import parse_number
+
+BOOT_BAUDRATE = 115200  # the firmware starts at this rate and always accepts switching back to it
+
+# Power-on values for the Clause 22 standard registers of a typical 10/100/1000 PHY
+DEFAULT_REGISTERS = {
+    0x00: 0x1140,  # BMCR: AN enabled, full duplex, 1000 Mb/s
+    0x01: 0x796D,  # BMSR: link up, AN complete
+    0x02: 0x2000,  # PHYID1
+    0x03: 0xA231,  # PHYID2
+    0x04: 0x01E1,  # ANAR
+    0x05: 0xC1E1,  # ANLPAR
+    0x06: 0x000F,  # ANER
+    0x09: 0x0300,  # 1000BASE-T control
+    0x0A: 0x3C00,  # 1000BASE-T status
+    0x0F: 0x3000,  # extended status
+}
+
+
+class SimulatedPhy:
+    def __init__(self, address, name, functions=None):
+        self.address = address
+        self.name = name
+        self.functions = functions or ["Reset", "Loopback"]
+        self.registers = [0] * 32
+        for reg, value in DEFAULT_REGISTERS.items():
+            self.registers[reg] = value
+
+    def read(self, reg):
+        return self.registers[reg] if 0 <= reg < len(self.registers) else 0xFFFF
+
+    def write(self, reg, value):
+        if 0 <= reg < len(self.registers):
+            self.registers[reg] = value & 0xFFFF
+
+
+class PhySimulator:
+    # Speaks the firmware's text protocol on the master side of a pseudo-terminal.
+    # Clients open slave_path exactly like a USB-serial adapter.
+    def __init__(self, phys=None, latency=0.0, jitter=0.0, noise=0.0, corruption=0.0, drop=0.0,
+                 baudrate=None, binary=True, baudrates=None, link_limit=None, seed=None):
+        self.device_name = "PHY Simulator"
+        self.properties = {"Controller": "Simulated MCU", "Software Version": "sim-1.0", "Speed": "1000 Mb/s"}
+        if binary:
+            self.properties["Protocol"] = f"TEXT, {PROTOCOL_NAME}"
+        if baudrates:
+            self.properties["Baudrates"] = ", ".join(str(rate) for rate in baudrates)
+        self.binary_supported = binary
+        self.binary_mode = False
+        self.functions = ["Reset", "Blink LED"]
+        self.phys = phys or [SimulatedPhy(1, "Sim PHY A"), SimulatedPhy(2, "Sim PHY B")]
+        self.latency = latency  # seconds added before every response
+        self.jitter = jitter  # extra uniform random delay, 0..jitter seconds
+        self.noise = noise  # probability of emitting a junk line before a response
+        self.corruption = corruption  # probability of corrupting one byte of a response
+        self.drop = drop  # probability of losing a response entirely
+        self.stall_for = 0.0  # one-off delay before the next response, see stall()
+        self.drops_pending = 0  # responses still to lose, see drop_responses()
+        self.baudrate = baudrate  # emulate wire time when set; a pty is otherwise unthrottled
+        self.baudrates = list(baudrates or [])
+        self.link_limit = link_limit  # fastest rate the emulated cable carries; above it nothing gets through
+        self.baud_fallback = None  # (old rate, deadline) while a switch waits for BAUD_CONFIRM
+        self.random = random.Random(seed)
+        self.commands = 0
+        self.master_fd = None
+        self.slave_fd = None
+        self.slave_path = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.slave_path = os.ttyname(self.slave_fd)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="phy-simulator", daemon=True)
+        self.thread.start()
+        return self.slave_path
+
+    def stop(self):
+        # Join before closing: closing an fd another thread is blocked reading does not
+        # release it, and clients would never see the hang-up
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=1)
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master_fd = self.slave_fd = None
+
+    def stall(self, seconds):
+        # The next response waits this long on top of the latency; everything behind it queues up
+        self.stall_for = seconds
+
+    def drop_responses(self, count=1):
+        self.drops_pending += count
+
+    def run(self):
+        buffer = bytearray()
+        while not self.stop_event.is_set():
+            if self.baud_fallback and time.monotonic() > self.baud_fallback[1]:
+                self.baudrate = self.baud_fallback[0]
+                self.baud_fallback = None
+            try:
+                if not select.select([self.master_fd], [], [], 0.1)[0]:
+                    continue
+                data = os.read(self.master_fd, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+
+            text_end = len(buffer)
+            if self.binary_mode:
+                for frame in extract_frames(buffer):
+                    self.handle_frame(frame)
+                partial = buffer.find(SYNC)
+                text_end = partial if partial >= 0 else len(buffer)
+
+            newline = buffer.rfind(b"\n", 0, text_end)
+            if newline < 0:
+                continue
+            complete = bytes(buffer[:newline])
+            del buffer[:newline + 1]
+            for raw in complete.split(b"\n"):
+                line = raw.decode(errors='ignore').strip()
+                if line:
+                    self.handle_command(line)
+
+    def find_phy(self, address):
+        wanted = parse_number(address)
+        for phy in self.phys:
+            if phy.address == wanted:
+                return phy
+        return None
+
+    def handle_command(self, command):
+        self.commands += 1
+        if self.link_limit and self.baudrate and self.baudrate > self.link_limit:
+            return  # garbled on the wire
+        if command == "INFO":
+            self.respond(self.info_lines())
+        elif command.startswith("READ_"):
+            self.respond(self.read_command(command))
+        elif command.startswith("WRITE_"):
+            self.write_command(command)
+        elif command.startswith("BAUD_"):
+            self.baud_command(command)
+        elif command == MODE_COMMAND and self.binary_supported:
+            self.respond([MODE_ACK])
+            self.binary_mode = True
+        else:
+            self.respond([f"OK {command}"])
+
+    def baud_command(self, command):
+        if command == "BAUD_CONFIRM":
+            if self.baud_fallback:
+                self.baud_fallback = None
+                self.respond([f"{command} OK"])
+            return
+        rate = command[len("BAUD_"):]
+        if not rate.isdigit() or int(rate) not in self.baudrates + [BOOT_BAUDRATE]:
+            self.respond([f"ERROR {command}"])
+            return
+        self.respond([f"{command} OK"])  # still at the old rate
+        self.baud_fallback = (self.baudrate, time.monotonic() + 1.0)
+        self.baudrate = int(rate)
+
+    def info_lines(self):
+        lines = ["INFO", f"Device: {self.device_name}"]
+        lines += [f"{key}: {value}" for key, value in self.properties.items()]
+        lines.append(f"FUNCTION: {', '.join(self.functions)}")
+        for index, phy in enumerate(self.phys, 1):
+            lines.append(f"PHY{index}: {phy.address} - {phy.name}")
+            lines.append(f"FUNCTION: {', '.join(phy.functions)}")
+        lines.append("END")
+        return lines
+
+    def read_command(self, command):
+        try:
+            _, phy_addr, reg_id = command.split("_", 2)
+            phy = self.find_phy(phy_addr)
+            reg = parse_number(reg_id)
+        except ValueError:
+            return [f"ERROR {command}"]
+        if phy is None:
+            return [f"ERROR unknown PHY {phy_addr}"]
+        return [f"READ_RESPONSE PHY: {phy.address} REG: 0x{reg:02X} VALUE: {phy.read(reg):04X}"]
+
+    def write_command(self, command):
+        try:
+            _, phy_addr, reg_id, value = command.split("_", 3)
+            phy = self.find_phy(phy_addr)
+            if phy:
+                phy.write(parse_number(reg_id), int(value, 16))
+        except ValueError:
+            self.respond([f"ERROR {command}"])
+
+    def handle_frame(self, frame):
+        self.commands += 1
+        phy = next((phy for phy in self.phys if phy.address == frame.phy), None)
+        op = frame.op | OP_RESPONSE
+        value = frame.value
+        if phy is None or frame.op not in (OP_READ, OP_WRITE):
+            op |= OP_ERROR
+        elif frame.op == OP_READ:
+            value = phy.read(frame.reg)
+        else:
+            phy.write(frame.reg, frame.value)
+        self.respond_bytes(bytearray(encode_frame(frame.seq, op, frame.phy, frame.reg, value)))
+
+    def respond(self, lines):
+        data = "".join(line + "\r\n" for line in lines).encode()
+        if self.noise and self.random.random() < self.noise:
+            junk = "".join(self.random.choice(string.ascii_letters + string.punctuation) for _ in range(12))
+            data = (junk + "\r\n").encode() + data
+        self.respond_bytes(bytearray(data))
+
+    def respond_bytes(self, data):
+        if self.drops_pending:
+            self.drops_pending -= 1
+            return
+        if self.drop and self.random.random() < self.drop:
+            return
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0) + self.stall_for
+        self.stall_for = 0.0
+        if delay:
+            time.sleep(delay)
+
+        if self.corruption and self.random.random() < self.corruption:
+            data[self.random.randrange(len(data) - 2)] = self.random.randrange(32, 127)
+
+        if self.baudrate:
+            time.sleep(len(data) * 10 / self.baudrate)
+        try:
+            os.write(self.master_fd, bytes(data))
+        except OSError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated PHY firmware on a pseudo-terminal")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, up to this many seconds")
+    parser.add_argument("--noise", type=float, default=0.0, help="probability of a junk line per response")
+    parser.add_argument("--corruption", type=float, default=0.0, help="probability of a corrupted response")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability of a lost response")
+    parser.add_argument("--baudrate", type=int, default=None, help="emulate the wire time of this baud rate")
+    parser.add_argument("--baudrates", type=lambda text: [int(rate) for rate in text.split(",")],
+                        default=None, help="comma-separated rates to offer for negotiation")
+    parser.add_argument("--link-limit", type=int, default=None, help="fastest rate that gets through")
+    parser.add_argument("--text-only", action="store_true", help="behave like firmware without binary framing")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    simulator = PhySimulator(latency=args.latency, jitter=args.jitter, noise=args.noise,
+                             corruption=args.corruption, drop=args.drop, baudrate=args.baudrate,
+                             binary=not args.text_only, baudrates=args.baudrates,
+                             link_limit=args.link_limit, seed=args.seed)
+    print(simulator.start(), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
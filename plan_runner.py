@@ -0,0 +1,176 @@
+import threading
+import time
+
+from mdio_script import (ARGUMENT_COUNTS as SCRIPT_ARGUMENT_COUNTS, BARRIERS, ScriptError, Step, StepResult,
+                         check_arguments, parse_hex, parse_script)
+from transactions import parse_number
+
+PLAN_HELP = """\
+# Test plan, run against every PHY of the board at once. Register numbers are decimal
+# unless written 0x..; values and masks are always hex.
+#   call <function>                         <addr>_<FUNCTION> for each PHY
+#   devcall <function>                      DEV_<FUNCTION>, once for the board
+#   write <reg> <value>
+#   read <reg>                              record the value in the report
+#   expect <reg> <value> [mask]             fail unless (register & mask) == value
+#   wait <ms>
+#   poll <reg> <bit> <0|1> [timeout_ms]
+"""
+
+# Plan steps run on every PHY, so the ones shared with scripts take no PHY address
+ARGUMENT_COUNTS = {kind: (low - 1, high - 1) for kind, (low, high) in SCRIPT_ARGUMENT_COUNTS.items()
+                   if kind in ("write", "read", "poll")}
+ARGUMENT_COUNTS.update(wait=SCRIPT_ARGUMENT_COUNTS["wait"], expect=(2, 3))
+
+
+def parse_plan_step(line, line_no):
+    words = line.split()
+    kind = words[0].lower()
+    args = words[1:]
+    if kind in ("call", "devcall"):
+        if not args:
+            raise ScriptError(line_no, f"{kind} needs a function name")
+        return Step(kind, [" ".join(args)], line, line_no)
+    check_arguments(words, line_no, ARGUMENT_COUNTS)
+
+    try:
+        if kind == "wait":
+            parsed = [parse_number(args[0])]
+        elif kind == "poll":
+            parsed = [parse_number(args[0]), parse_number(args[1]), parse_number(args[2]),
+                      parse_number(args[3]) if len(args) > 3 else 1000]
+        elif kind == "expect":
+            parsed = [parse_number(args[0]), parse_hex(args[1]), parse_hex(args[2]) if len(args) > 2 else 0xFFFF]
+        else:
+            parsed = [parse_number(args[0])] + [parse_hex(arg) for arg in args[1:]]
+    except ValueError:
+        raise ScriptError(line_no, f"invalid number in '{line}'")
+
+    return Step(kind, parsed, line, line_no)
+
+
+def parse_plan(text):
+    return parse_script(text, parse_plan_step)
+
+
+class PlanResult(StepResult):
+    def __init__(self, phy, step, value=None, error=None, detail=""):
+        super().__init__(step, value, error, detail)
+        self.phy = phy  # None for board-level steps
+
+
+class PlanRunner:
+    # Runs a plan on all PHYs in lockstep. Each register step goes out for every PHY as one
+    # pipelined burst, and bursts for consecutive steps are sent without waiting for the
+    # previous one, so the link stays busy and N PHYs take about as long as one. Results are
+    # collected at the next wait or poll (or the end); a PHY that failed a step by then is
+    # left out of the rest of the plan.
+    def __init__(self, client, timeout=None, poll_interval=0.01):
+        self.client = client
+        self.timeout = timeout
+        self.poll_interval = poll_interval  # seconds between the polling rounds of a poll step
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self, steps, phy_addrs=None, on_result=None):
+        phys = list(phy_addrs if phy_addrs is not None else self.client.phy_addresses())
+        results = []
+        in_flight = []
+        failed = set()
+
+        def emit(result):
+            results.append(result)
+            if result.error and result.phy is not None:
+                failed.add(result.phy)
+            if on_result:
+                on_result(result)
+
+        for step in steps:
+            if self.stop_event.is_set():
+                break
+            active = [phy for phy in phys if phy not in failed]
+            if step.kind in BARRIERS:
+                self.collect(in_flight, emit)
+                in_flight = []
+                active = [phy for phy in active if phy not in failed]
+                if step.kind == "wait":
+                    if self.stop_event.wait(step.args[0] / 1000):
+                        break
+                    emit(PlanResult(None, step, detail=f"waited {step.args[0]} ms"))
+                else:
+                    for result in self.poll(step, active):
+                        emit(result)
+            elif step.kind == "devcall":
+                emit(PlanResult(None, step, detail=self.client.call(step.args[0])))
+            elif step.kind == "call":
+                for phy in active:
+                    emit(PlanResult(phy, step, detail=self.client.call(step.args[0], phy)))
+            else:
+                in_flight += self.send(step, active)
+
+        self.collect(in_flight, emit)
+        return results
+
+    def send(self, step, phys):
+        reg = step.args[0]
+        if step.kind == "write":
+            operations = [("write", phy, reg, step.args[1]) for phy in phys]
+        else:
+            operations = [("read", phy, reg) for phy in phys]
+        transactions = self.client.batch(operations, self.timeout)
+        return [(step, phy, txn) for phy, txn in zip(phys, transactions)]
+
+    def collect(self, in_flight, emit):
+        for step, phy, txn in in_flight:
+            try:
+                value = txn.wait()
+            except Exception as e:
+                emit(PlanResult(phy, step, error=f"error: {e}"))
+                continue
+            if step.kind == "expect":
+                _, expected, mask = step.args
+                if value & mask != expected & mask:
+                    emit(PlanResult(phy, step, value=value, error=f"got {value:04X}, expected {expected:04X}"))
+                    continue
+            emit(PlanResult(phy, step, value=value if step.kind != "write" else None))
+
+    def poll(self, step, phys):
+        # Polls every PHY in one burst per round until each has the bit or the timeout passes
+        reg, bit, expected, timeout_ms = step.args
+        deadline = time.time() + timeout_ms / 1000
+        waiting = list(phys)
+        attempts = 0
+        while waiting and not self.stop_event.is_set():
+            attempts += 1
+            # Through the client, so a write still queued for the register goes out first
+            transactions = self.client.batch([("read", phy, reg) for phy in waiting], self.timeout)
+            still_waiting = []
+            for phy, txn in zip(waiting, transactions):
+                try:
+                    value = txn.wait()
+                except Exception as e:
+                    yield PlanResult(phy, step, error=f"error: {e}")
+                    continue
+                if (value >> bit) & 1 == expected:
+                    yield PlanResult(phy, step, value=value, detail=f"{value:04X} after {attempts} reads")
+                elif time.time() >= deadline:
+                    yield PlanResult(phy, step, value=value, error=f"timeout, last {value:04X}")
+                else:
+                    still_waiting.append(phy)
+            waiting = still_waiting
+            if waiting:
+                self.stop_event.wait(min(self.poll_interval, max(0.0, deadline - time.time())))
+        for phy in waiting:
+            yield PlanResult(phy, step, error="stopped")
+
+
+def plan_summary(results, phy_addrs):
+    # {phy: (steps run, failures)} for the report footer
+    summary = {phy: [0, 0] for phy in phy_addrs}
+    for result in results:
+        if result.phy in summary:
+            summary[result.phy][0] += 1
+            summary[result.phy][1] += bool(result.error)
+    return summary
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from transactions import parse_number
+
+
+class WatchEntry:
+    def __init__(self, phy_addr, reg, rate, label=""):
+        self.phy_addr = phy_addr
+        self.phy = parse_number(phy_addr)
+        self.reg = reg
+        if rate <= 0:
+            raise ValueError(f"watch rate must be above 0 Hz, got {rate}")
+        self.period = 1.0 / rate
+        self.label = label
+        self.next_due = 0.0
+        self.value = None
+        self.changes = 0
+        self.changed_at = None
+        self.samples = 0
+        self.errors = 0
+
+    @property
+    def key(self):
+        return (self.phy, self.reg)
+
+
+class RegisterWatcher:
+    # Polls a list of registers, each at its own rate. Reads that fall due together go out
+    # as one pipelined batch, and on_change fires only when a value differs from the last
+    # sample (the first sample of an entry is reported with old value None).
+    def __init__(self, client, on_change=None, on_error=None):
+        self.client = client
+        self.on_change = on_change  # called from the watcher thread with (entry, old, new)
+        self.on_error = on_error  # called from the watcher thread with (entry, exception)
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def add(self, phy_addr, reg_id, rate=10.0, label=""):
+        entry = WatchEntry(phy_addr, parse_number(reg_id), rate, label)
+        with self.lock:
+            self.entries[entry.key] = entry
+        self.wakeup.set()
+        return entry
+
+    def remove(self, phy, reg):
+        with self.lock:
+            return self.entries.pop((phy, reg), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def start(self):
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="register-watch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            now = time.time()
+            with self.lock:
+                entries = list(self.entries.values())
+            due = [entry for entry in entries if entry.next_due <= now]
+            if due:
+                self.sample(due)
+                for entry in due:
+                    # Keep the cadence, but never try to catch up on missed samples
+                    entry.next_due = max(entry.next_due + entry.period, now)
+
+            with self.lock:
+                next_due = min((entry.next_due for entry in self.entries.values()), default=now + 1)
+            self.wakeup.wait(max(0.0, next_due - time.time()))
+            self.wakeup.clear()
+
+    def sample(self, due):
+        transactions = self.client.transactions.read_many([(entry.phy_addr, entry.reg) for entry in due])
+        for entry, txn in zip(due, transactions):
+            try:
+                value = txn.wait()
+            except Exception as e:
+                entry.errors += 1
+                if self.on_error:
+                    self.on_error(entry, e)
+                continue
+
+            entry.samples += 1
+            if value == entry.value:
+                continue
+            old = entry.value
+            entry.value = value
+            if old is not None:
+                entry.changes += 1
+            entry.changed_at = time.time()
+            if self.on_change:
+                self.on_change(entry, old, value)
+
+
+def flipped_bits(old, new):
+    if old is None:
+        return []
+    diff = old ^ new
+    return [bit for bit in range(15, -1, -1) if diff >> bit & 1]
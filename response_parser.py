@@ -0,0 +1,154 @@
+import re
+
+PHY_LINE = re.compile(r"^PHY\d+:")
+REGISTER_VALUE = re.compile(r"[0-9A-Fa-f]{1,4}")  # int(text, 16) would also take signs, "_" and spaces
+
+
+def parse_number(text):
+    text = str(text).strip()
+    return int(text, 16 if 'x' in text.lower() else 10)
+
+
+class PhyEntry:
+    def __init__(self, label, address, name, functions=None):
+        self.label = label  # the raw INFO line, e.g. "PHY1: 0x01 - DP83867"
+        self.address = address
+        self.name = name
+        self.functions = functions or []
+
+    @property
+    def display_text(self):
+        return f"{self.address} - {self.name}" if self.address else self.name
+
+
+class DeviceInfo:
+    def __init__(self, name="", properties=None, functions=None, phys=None):
+        self.name = name
+        self.properties = properties or {}  # CONTROLLER, SOFTWARE VERSION, SPEED, ...
+        self.functions = functions or []
+        self.phys = phys or []
+
+    @property
+    def phy_addresses(self):
+        return [phy.address for phy in self.phys if phy.address]
+
+
+# Events emitted by ResponseParser, one per line at most
+class InfoComplete:
+    __slots__ = ("device",)
+
+    def __init__(self, device):
+        self.device = device
+
+
+class PhyFound:
+    __slots__ = ("device", "phy")
+
+    def __init__(self, device, phy):
+        self.device = device  # the DeviceInfo still being filled in
+        self.phy = phy
+
+
+class FunctionsFound:
+    __slots__ = ("owner", "functions")
+
+    def __init__(self, owner, functions):
+        self.owner = owner  # the DeviceInfo or PhyEntry the FUNCTION line belongs to
+        self.functions = functions
+
+
+class ReadResponse:
+    __slots__ = ("phy", "reg", "value")
+
+    def __init__(self, phy, reg, value):
+        self.phy = phy
+        self.reg = reg
+        self.value = value
+
+
+class ErrorResponse:
+    __slots__ = ("message", "command")
+
+    def __init__(self, message, command=None):
+        self.message = message
+        self.command = command  # set when the firmware echoed the failed command
+
+
+def parse_phy_line(line):
+    address = ""
+    name = line
+    if PHY_LINE.match(line):
+        parts = line.split("-", 1)
+        if len(parts) == 2:
+            address = parts[0].split(":")[1].strip()
+            name = parts[1].strip()
+    return PhyEntry(line.strip(), address, name)
+
+
+def parse_read_response(line):
+    # READ_RESPONSE PHY: <phy> REG: <reg> VALUE: <value>
+    parts = line.split()
+    if len(parts) < 7 or parts[0] != "READ_RESPONSE" or not REGISTER_VALUE.fullmatch(parts[6]):
+        return None
+    try:
+        return int(parts[2]), parse_number(parts[4]), int(parts[6], 16)
+    except ValueError:
+        return None
+
+
+def parse_error(line):
+    # "ERROR <command>" for a rejected command, or "ERROR <free text>"
+    message = line[len("ERROR"):].strip()
+    command = message if message.startswith(("READ_", "WRITE_")) and " " not in message else None
+    return ErrorResponse(message, command)
+
+
+class ResponseParser:
+    # Incremental parser for everything the firmware prints. feed() takes one line at a
+    # time and returns an event, or None for lines that carry nothing to act on. An INFO
+    # block is built up as its lines arrive, however many reads it spans, and read
+    # responses or errors interleaved with it are still reported straight away.
+    def __init__(self):
+        self.device = None  # DeviceInfo being collected, None outside an INFO block
+        self.current = None  # owner of the next FUNCTION line
+
+    def reset(self):
+        self.device = None
+        self.current = None
+
+    def feed(self, line):
+        if line.startswith("READ_RESPONSE"):
+            response = parse_read_response(line)
+            return ReadResponse(*response) if response else None
+        if line.startswith("ERROR"):
+            return parse_error(line)
+
+        if line == "INFO":
+            self.device = DeviceInfo()
+            self.current = None
+            return None
+        if self.device is None:
+            if not line.startswith("Device:"):
+                return None
+            self.device = DeviceInfo()  # firmware that does not echo INFO
+
+        device = self.device
+        if line == "END":
+            self.reset()
+            return InfoComplete(device)
+        if line.startswith("Device:"):
+            device.name = line.replace("Device:", "").strip()
+            self.current = device
+        elif line.startswith("PHY"):
+            self.current = parse_phy_line(line)
+            device.phys.append(self.current)
+            return PhyFound(device, self.current)
+        elif line.startswith("FUNCTION:"):
+            functions = [f.strip() for f in line.replace("FUNCTION:", "").split(",")]
+            if self.current is not None:
+                self.current.functions = functions
+                return FunctionsFound(self.current, functions)
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            device.properties[key.strip().upper()] = value.strip()
+        return None
@@ -0,0 +1,356 @@
+import argparse
+import getpass
+import glob
+import os
+import select
+import selectors
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import deque
+
+import serial
+
+from response_parser import parse_number, parse_read_response
+
+# Shares one serial port between several local processes (GUI, scripts, the CLI). The broker
+# owns the port and listens on a Unix socket; clients connect with the port name
+# "broker:<socket path>" and speak the ordinary text protocol over it, one line per command.
+# Responses go back to whoever asked: READ_RESPONSE lines to the oldest reader of that
+# register, INFO blocks to the oldest INFO requester, "ERROR <command>" to the sender of that
+# command. Everything else (function replies, asynchronous output) goes to every client.
+# Binary framing and baud rate changes would affect all clients at once, so the broker
+# keeps the link in text mode and hides both from the INFO it relays.
+BROKER_PREFIX = "broker:"
+HIDDEN_PROPERTIES = ("Protocol:", "Baudrates:")
+MAX_ERROR_ROUTES = 1024
+READ_EXPIRY = 5.0  # a read still unanswered after this long was lost; its slot is dropped
+
+
+def broker_dir():
+    # One directory per user, readable only by them: the socket gives full control of the board
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"phy-broker-{user}")
+
+
+def make_broker_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+
+
+def socket_path(port):
+    name = port.strip("/").replace("/", "_").replace("\\", "_").replace(":", "_")
+    return os.path.join(broker_dir(), f"{name}.sock")
+
+
+def list_brokers(probe=True):
+    # {label: port name} for this user's broker sockets. probe connects to each to leave out
+    # sockets of a broker that died; the port watcher, which lists them twice a second, skips it
+    brokers = {}
+    for path in sorted(glob.glob(os.path.join(broker_dir(), "*.sock"))):
+        if probe:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(path)
+            except OSError:
+                continue
+        brokers[f"{BROKER_PREFIX}{path} - shared port"] = BROKER_PREFIX + path
+    return brokers
+
+
+class BrokerPort:
+    # The subset of serial.Serial that SerialManager uses, over a broker socket
+    def __init__(self, path, timeout=0.05):
+        self.path = path
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.baudrate = None  # owned by the broker
+        self.pending = b""
+
+    @property
+    def is_open(self):
+        return self.sock is not None
+
+    @property
+    def in_waiting(self):
+        if not self.pending and select.select([self.sock], [], [], 0)[0]:
+            self.receive()
+        return len(self.pending)
+
+    def receive(self):
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("Broker closed the connection")
+        self.pending += data
+
+    def read(self, size=1):
+        if not self.pending and select.select([self.sock], [], [], self.timeout)[0]:
+            self.receive()
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class BrokerClient:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.outgoing = bytearray()
+        self.writing = False  # registered for EVENT_WRITE while outgoing data is backed up
+
+
+class SerialBroker:
+    # Single-threaded: one selector loop reads the serial port and every client socket
+    def __init__(self, port, baudrate=115200, path=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.path = path or socket_path(port)
+        self.ser = None
+        self.server = None
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}  # socket -> BrokerClient
+        self.buffer = bytearray()
+        self.reads = {}  # (phy, reg) -> deque of (client, sent at) waiting for READ_RESPONSE
+        self.infos = deque()  # clients waiting for an INFO block, oldest first
+        self.info_client = None  # receiver of the INFO block being relayed, None for everyone
+        self.in_info = False
+        self.senders = {}  # command -> last client that sent it, for routing "ERROR <command>"
+        self.running = False
+
+    def start(self):
+        self.ser = serial.Serial(self.port, self.baudrate, timeout=0, exclusive=True)
+        if os.path.dirname(self.path) == broker_dir():
+            make_broker_dir(broker_dir())
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left behind by a broker that did not shut down cleanly
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        os.chmod(self.path, 0o600)  # for a --socket outside the per-user directory
+        self.server.listen()
+        self.server.setblocking(False)
+        self.selector.register(self.server, selectors.EVENT_READ, "accept")
+        self.selector.register(self.ser.fileno(), selectors.EVENT_READ, "serial")
+        self.running = True
+        return self.path
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        for client in list(self.clients.values()):
+            self.drop(client)
+        for handle in (self.server, self.ser):
+            if handle is not None:
+                handle.close()
+        self.server = self.ser = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        try:
+            while self.running:
+                for key, events in self.selector.select(timeout=0.5):
+                    if key.data == "accept":
+                        self.accept()
+                    elif key.data == "serial":
+                        self.read_serial()
+                    elif events & selectors.EVENT_WRITE:
+                        self.flush_client(key.data)
+                    else:
+                        self.read_client(key.data)
+        finally:
+            self.close()
+
+    def accept(self):
+        try:
+            sock, _ = self.server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        client = BrokerClient(sock)
+        self.clients[sock] = client
+        self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def drop(self, client):
+        self.clients.pop(client.sock, None)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        for key, waiting in self.reads.items():
+            self.reads[key] = deque(entry for entry in waiting if entry[0] is not client)
+        if client in self.infos:
+            self.infos.remove(client)
+        if self.info_client is client:
+            self.info_client = None
+
+    def read_client(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(client)
+            return
+        client.buffer += data
+        newline = client.buffer.rfind(b"\n")
+        if newline < 0:
+            return
+        lines = client.buffer[:newline].decode(errors='ignore').split("\n")
+        del client.buffer[:newline + 1]
+
+        commands = []
+        for line in lines:
+            command = line.strip()
+            if not command:
+                continue
+            if command.startswith("BAUD_") or command.startswith("MODE_"):
+                self.send_to(client, f"ERROR {command}")
+                continue
+            self.route_command(client, command)
+            commands.append(command)
+        if commands:
+            # Each client's burst goes out in one write; bursts from different clients interleave
+            self.ser.write("".join(command + "\n" for command in commands).encode())
+
+    def route_command(self, client, command):
+        if command == "INFO":
+            self.infos.append(client)
+            return
+        if len(self.senders) >= MAX_ERROR_ROUTES:
+            self.senders.clear()
+        self.senders[command] = client
+        if command.startswith("READ_"):
+            try:
+                _, phy_addr, reg_id = command.split("_", 2)
+                key = (parse_number(phy_addr), parse_number(reg_id))
+            except ValueError:
+                return
+            self.reads.setdefault(key, deque()).append((client, time.monotonic()))
+
+    def read_serial(self):
+        try:
+            data = self.ser.read(self.ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            self.stop()
+            return
+        self.buffer += data
+        newline = self.buffer.rfind(b"\n")
+        if newline < 0:
+            return
+        lines = self.buffer[:newline].decode(errors='ignore').split("\n")
+        del self.buffer[:newline + 1]
+        for line in lines:
+            line = line.strip()
+            if line:
+                self.route_line(line)
+
+    def route_line(self, line):
+        if line.startswith("READ_RESPONSE"):
+            response = parse_read_response(line)
+            self.send_to(self.pop_reader(response[:2]) if response else None, line)
+            return
+        if line.startswith("ERROR"):
+            command = line[len("ERROR"):].strip()
+            client = self.senders.pop(command, None)
+            if client and command.startswith("READ_"):
+                try:
+                    _, phy_addr, reg_id = command.split("_", 2)
+                    self.pop_reader((parse_number(phy_addr), parse_number(reg_id)))
+                except ValueError:
+                    pass
+            self.send_to(client, line)
+            return
+
+        if line == "INFO" or (line.startswith("Device:") and not self.in_info):
+            self.in_info = True
+            self.info_client = self.infos.popleft() if self.infos else None
+        if self.in_info:
+            if line == "END":
+                self.in_info = False
+            elif line.startswith(HIDDEN_PROPERTIES):
+                return
+            self.send_to(self.info_client, line)
+            return
+        self.send_to(None, line)
+
+    def pop_reader(self, key):
+        waiting = self.reads.get(key)
+        expired = time.monotonic() - READ_EXPIRY
+        while waiting:
+            client, sent_at = waiting.popleft()
+            if sent_at >= expired:
+                return client
+        return None
+
+    def send_to(self, client, line):
+        # client None sends to everyone
+        data = (line + "\r\n").encode()
+        for target in ([client] if client else list(self.clients.values())):
+            if target.sock not in self.clients:
+                continue
+            target.outgoing += data
+            self.flush_client(target)
+
+    def flush_client(self, client):
+        try:
+            sent = client.sock.send(client.outgoing)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(client)
+            return
+        del client.outgoing[:sent]
+        # A slow reader gets the rest when its socket drains instead of stalling everyone else
+        writing = bool(client.outgoing)
+        if writing != client.writing:
+            client.writing = writing
+            self.selector.modify(client.sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0), client)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share one serial port with several local clients")
+    parser.add_argument("port", help="serial port, e.g. /dev/ttyUSB0")
+    parser.add_argument("-b", "--baudrate", type=int, default=115200)
+    parser.add_argument("--socket", help="socket path (default: derived from the port name)")
+    args = parser.parse_args(argv)
+
+    broker = SerialBroker(args.port, args.baudrate, args.socket)
+    try:
+        path = broker.start()
+    except (serial.SerialException, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{BROKER_PREFIX}{path}", flush=True)
+    # Shut down cleanly on kill too: the port watcher lists sockets without probing them, so
+    # one left behind would show up as a port until the next broker for that port starts
+    signal.signal(signal.SIGTERM, lambda signum, frame: broker.stop())
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
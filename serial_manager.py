@@ -0,0 +1,318 @@
+import serial
+import serial.tools.list_ports
+import sys
+import threading
+import time
+from collections import deque
+
+from binary_protocol import SYNC, extract_frames
+from response_parser import ResponseParser
+from serial_broker import BROKER_PREFIX, BrokerPort, list_brokers
+from transactions import TransactionEngine
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+try:
+    import termios
+except ImportError:  # not on Windows
+    termios = None
+
+# What a port that vanished underneath us can raise; tcdrain() on an unplugged adapter
+# fails with termios.error, which is not an OSError
+PORT_ERRORS = (serial.SerialException, OSError) + ((termios.error,) if termios else ())
+
+
+def usb_id(device):
+    # "VID:PID" of the USB adapter behind a port, None for built-in UARTs, Bluetooth and the like
+    for port in serial.tools.list_ports.comports():
+        if port.device == device and port.vid is not None:
+            return f"{port.vid:04X}:{port.pid:04X}"
+    return None
+
+
+def board_ports(match):
+    # USB adapters whose VID:PID or description contains match (case-insensitive). Ports that
+    # are not USB adapters never match, so nothing else gets probed with board commands.
+    match = match.strip().lower()
+    if not match:
+        return []
+    return [port.device for port in serial.tools.list_ports.comports()
+            if port.vid is not None and (match in f"{port.vid:04X}:{port.pid:04X}".lower()
+                                         or match in (port.description or "").lower())]
+
+
+class SerialManager:
+    def __init__(self, max_lines=4096):
+        self.ser = None
+        self.port = None
+        self.port_map = {}
+        self.lines = deque(maxlen=max_lines)  # (timestamp, line); append/popleft are atomic
+        self.on_data = None  # called from the reader thread when new lines or an error arrive
+        self.reader_error = None
+        self.reader_thread = None
+        self.stop_event = threading.Event()
+        self.listeners = []  # called from the reader thread with every received line
+        self.frame_listeners = []  # same, for binary frames once framing is negotiated
+        self.event_listeners = []  # same, for the events ResponseParser makes of those lines
+        self.parser = ResponseParser()
+        self.binary = False
+        self.buffer = bytearray()
+        self.capture = None  # CaptureWriter recording TX/RX lines and register transactions
+        # Held for every write, so bursts from different threads never interleave; the
+        # transaction engine also holds it while queueing reads, so wire order matches FIFO order
+        self.send_lock = threading.RLock()
+        self.transactions = TransactionEngine(self)
+        self.add_event_listener(self.transactions.handle_event)
+        self.frame_listeners.append(self.transactions.handle_frame)
+
+    # Listener lists are replaced rather than mutated so the reader thread can iterate them
+    # while other threads (or a listener itself) add and remove callbacks
+    def add_listener(self, callback):
+        self.listeners = self.listeners + [callback]
+
+    def remove_listener(self, callback):
+        self.listeners = [listener for listener in self.listeners if listener is not callback]
+
+    def add_event_listener(self, callback):
+        self.event_listeners = self.event_listeners + [callback]
+
+    def remove_event_listener(self, callback):
+        self.event_listeners = [listener for listener in self.event_listeners if listener is not callback]
+
+    def list_ports(self):
+        ports = serial.tools.list_ports.comports()
+        self.port_map = {f"{port.device} - {port.description}": port.device for port in ports}
+        self.port_map.update(list_brokers())
+        return list(self.port_map.keys())
+
+    def connect(self, port, baudrate=115200, reader=True):
+        # With reader=False the caller drives I/O through read_available(), e.g. from a
+        # selector loop shared by many ports
+        if port.startswith(BROKER_PREFIX):
+            self.ser = BrokerPort(port[len(BROKER_PREFIX):], timeout=0.05)
+        else:
+            self.ser = serial.Serial(port, baudrate, timeout=0.05)
+        self.port = port
+        self.buffer = bytearray()
+        self.reader_error = None
+        self.lines.clear()
+        self.parser.reset()
+        self.set_binary(False)
+        self.transactions.cache.invalidate()
+        if reader:
+            self.start_reader()
+
+    def fileno(self):
+        return self.ser.fileno()
+
+    def disconnect(self):
+        self.stop_reader()
+        self.transactions.fail_all(ConnectionError("Serial port closed"))
+        ser, self.ser = self.ser, None
+        if ser and ser.is_open:
+            try:
+                ser.flush()
+            except PORT_ERRORS:
+                pass
+            finally:
+                try:
+                    ser.close()
+                except PORT_ERRORS:
+                    pass
+
+    def send(self, message):
+        with self.send_lock:
+            if self.ser and self.ser.is_open:
+                self.ser.write((message + "\n").encode())
+                if self.capture:
+                    self.capture.tx(message)
+
+    def send_many(self, messages):
+        # One write for the whole batch so the commands go out back to back
+        with self.send_lock:
+            if messages and self.ser and self.ser.is_open:
+                self.ser.write("".join(message + "\n" for message in messages).encode())
+                if self.capture:
+                    for message in messages:
+                        self.capture.tx(message)
+
+    def send_bytes(self, data):
+        with self.send_lock:
+            if data and self.ser and self.ser.is_open:
+                self.ser.write(data)
+
+    @property
+    def baudrate(self):
+        return self.ser.baudrate if self.ser else None
+
+    def set_baudrate(self, baudrate):
+        # Reconfigures the open port in place; anything still queued goes out at the old rate
+        # first, and no other thread's burst can start until the new rate is set
+        with self.send_lock:
+            self.ser.flush()
+            self.ser.baudrate = baudrate
+
+    def set_binary(self, enabled):
+        self.binary = enabled
+        self.transactions.binary = enabled
+
+    def start_reader(self):
+        self.stop_reader()
+        self.reader_error = None
+        self.stop_event.clear()
+        self.reader_thread = threading.Thread(target=self.reader_loop, name="serial-reader", daemon=True)
+        self.reader_thread.start()
+
+    def stop_reader(self):
+        thread = self.reader_thread
+        if not thread:
+            return
+        self.stop_event.set()
+        if self.ser and hasattr(self.ser, 'cancel_read'):
+            try:
+                self.ser.cancel_read()
+            except PORT_ERRORS:
+                pass
+        if thread is not threading.current_thread():
+            thread.join(timeout=1)
+        self.reader_thread = None
+
+    def reader_loop(self):
+        while not self.stop_event.is_set():
+            self.transactions.expire()
+            if not self.read_available():
+                return
+
+    def read_available(self):
+        ser = self.ser
+        try:
+            data = ser.read(ser.in_waiting or 1)
+            waiting = ser.in_waiting  # the byte that ended a blocking read is usually not alone
+            if waiting:
+                data += ser.read(waiting)
+        except PORT_ERRORS + (TypeError, AttributeError) as e:
+            if not self.stop_event.is_set() and not self.reader_error:
+                self.reader_error = e
+                self.transactions.fail_all(e)
+                self.notify()
+            return False
+        if data:
+            self.feed(data)
+        return True
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        text_end = len(buffer)
+        if self.binary:
+            for frame in extract_frames(buffer):
+                for listener in self.frame_listeners:
+                    listener(frame)
+            # A frame still arriving may contain newline bytes; only split text before it
+            partial = buffer.find(SYNC)
+            text_end = partial if partial >= 0 else len(buffer)
+
+        newline = buffer.rfind(b"\n", 0, text_end)
+        if newline < 0:
+            return
+        # Decode every complete line with one call straight out of the buffer, then drop them;
+        # a partial line stays behind for the next read
+        with memoryview(buffer)[:newline] as view:
+            text = str(view, 'utf-8', 'ignore')
+        del buffer[:newline + 1]
+
+        now = time.time()
+        received = False
+        capture = self.capture
+        for line in text.split("\n"):
+            line = line.strip()
+            if line:
+                if capture:
+                    capture.rx(line)
+                for listener in self.listeners:
+                    listener(line)
+                event = self.parser.feed(line)
+                if event:
+                    for listener in self.event_listeners:
+                        listener(event)
+                self.lines.append((now, line))
+                received = True
+        if received:
+            self.notify()
+
+    def notify(self):
+        if self.on_data:
+            self.on_data()
+
+    def read_timestamped(self):
+        lines = []
+        while self.lines:
+            try:
+                lines.append(self.lines.popleft())
+            except IndexError:
+                break
+        return lines
+
+    def read_lines(self):
+        return [line for _, line in self.read_timestamped()]
+
+
+class PortWatcher:
+    # Watches for serial adapters coming and going off the Tk thread and reports only changes.
+    # Uses udev hot-plug notifications when pyudev is available, otherwise polls comports().
+    def __init__(self, on_change, interval=0.5):
+        self.on_change = on_change  # called from the watcher thread with (ports, added, removed)
+        self.interval = interval
+        self.ports = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="port-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def scan(self):
+        ports = {f"{port.device} - {port.description}": port.device for port in serial.tools.list_ports.comports()}
+        ports.update(list_brokers(probe=False))
+        if ports.keys() == self.ports.keys():
+            return
+        added = [label for label in ports if label not in self.ports]
+        removed = [label for label in self.ports if label not in ports]
+        self.ports = ports
+        self.on_change(dict(ports), added, removed)
+
+    def udev_monitor(self):
+        if pyudev is None or not sys.platform.startswith('linux'):
+            return None
+        try:
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by('tty')
+            monitor.start()
+            return monitor
+        except (ImportError, OSError):
+            return None
+
+    def run(self):
+        monitor = self.udev_monitor()
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except OSError:
+                pass
+
+            if monitor is None:
+                self.stop_event.wait(self.interval)
+                continue
+            # Sleep until the kernel reports a tty add/remove; the timeout only bounds shutdown
+            while not self.stop_event.is_set() and monitor.poll(timeout=self.interval) is None:
+                pass
+            # An adapter usually fires a burst of events; settle before rescanning once
+            while monitor.poll(timeout=0.05) is not None:
+                pass
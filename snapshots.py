@@ -0,0 +1,229 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BITS = np.arange(16, dtype=np.uint16)
+
+
+class SnapshotStore:
+    # Register dumps as dense arrays indexed [board, phy, register, time]. values holds the
+    # register contents and valid marks the cells that were actually read (a board missing
+    # from a snapshot or a read that timed out stays invalid), so every query below is a
+    # handful of whole-array operations instead of Python loops over dumps. registers lays
+    # out the register axis up front; registers outside it are added as they show up.
+    def __init__(self, registers=range(32)):
+        self.registers = list(registers)
+        self.reg_index = {reg: index for index, reg in enumerate(self.registers)}
+        self.boards = []
+        self.board_index = {}
+        self.phys = []
+        self.phy_index = {}
+        self.times = []
+        self.labels = []
+        shape = (0, 0, len(self.registers), 0)
+        self.values = np.zeros(shape, dtype=np.uint16)
+        self.valid = np.zeros(shape, dtype=bool)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def data(self):
+        return self.values[..., :len(self.times)]
+
+    @property
+    def mask(self):
+        return self.valid[..., :len(self.times)]
+
+    def slot_for(self, names, index, name):
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+        return index[name]
+
+    def grow(self, slots):
+        # The time axis doubles when full so adding snapshots is amortised O(1); the board,
+        # PHY and register axes only grow when a new one shows up
+        boards, phys, registers, capacity = self.values.shape
+        if slots > capacity:
+            capacity = max(slots, capacity * 2, 16)
+        shape = (max(boards, len(self.boards)), max(phys, len(self.phys)), max(registers, len(self.registers)),
+                 capacity)
+        if shape == self.values.shape:
+            return
+        values = np.zeros(shape, dtype=np.uint16)
+        valid = np.zeros(shape, dtype=bool)
+        values[:boards, :phys, :registers, :self.values.shape[3]] = self.values
+        valid[:boards, :phys, :registers, :self.valid.shape[3]] = self.valid
+        self.values, self.valid = values, valid
+
+    def add(self, dumps, timestamp=None, label=""):
+        # dumps: {board: {(phy, reg): value or None}}, e.g. the result of BoardManager.dump_all()
+        cells = []
+        for board, values in dumps.items():
+            board_slot = self.slot_for(self.boards, self.board_index, board)
+            for (phy, reg), value in values.items():
+                if value is None:
+                    continue
+                phy_slot = self.slot_for(self.phys, self.phy_index, phy)
+                reg_slot = self.slot_for(self.registers, self.reg_index, reg)
+                cells.append((board_slot, phy_slot, reg_slot, value))
+
+        slot = len(self.times)
+        self.grow(slot + 1)
+        if cells:
+            board_slots, phy_slots, reg_slots, values = np.array(cells, dtype=np.int64).T
+            self.values[board_slots, phy_slots, reg_slots, slot] = values
+            self.valid[board_slots, phy_slots, reg_slots, slot] = True
+        self.times.append(time.time() if timestamp is None else timestamp)
+        self.labels.append(label)
+        return slot
+
+    def snapshot(self, board, slot):
+        # One board's dump as {(phy, reg): value}, e.g. to use as the golden reference
+        board_slot = self.board_index[board]
+        values = self.data[board_slot, :, :, slot]
+        valid = self.mask[board_slot, :, :, slot]
+        return {(self.phys[p], self.registers[r]): int(values[p, r]) for p, r in zip(*np.nonzero(valid))}
+
+    def diff(self, first, second):
+        # XOR of two snapshots, [board, phy, register]; zero where either side was not read
+        both = self.mask[..., first] & self.mask[..., second]
+        return np.where(both, self.data[..., first] ^ self.data[..., second], 0).astype(np.uint16)
+
+    def changes(self, first, second):
+        data = self.data
+        return [(self.boards[b], self.phys[p], self.registers[r], int(data[b, p, r, first]), int(data[b, p, r, second]))
+                for b, p, r in zip(*np.nonzero(self.diff(first, second)))]
+
+    def bit_toggles(self):
+        # How often each bit changed between consecutive snapshots that both read it,
+        # [board, phy, register, bit] with bit 0 the LSB
+        data, mask = self.data, self.mask
+        both = mask[..., 1:] & mask[..., :-1]
+        flips = np.where(both, data[..., 1:] ^ data[..., :-1], 0).astype(np.uint16)
+        return ((flips[..., None] >> BITS) & 1).sum(axis=-2)
+
+    def golden_mismatches(self, golden, care=None):
+        # Bits that differ from golden ({(phy, reg): value}), [board, phy, register, time].
+        # care ({(phy, reg): mask}) leaves out bits that legitimately move, like link state
+        shape = self.values.shape[1:3]
+        expected = np.zeros(shape, dtype=np.uint16)
+        known = np.zeros(shape, dtype=bool)
+        care_bits = np.full(shape, 0xFFFF, dtype=np.uint16)
+        for (phy, reg), value in golden.items():
+            if phy in self.phy_index and reg in self.reg_index:
+                expected[self.phy_index[phy], self.reg_index[reg]] = value
+                known[self.phy_index[phy], self.reg_index[reg]] = True
+        for (phy, reg), bits in (care or {}).items():
+            if phy in self.phy_index and reg in self.reg_index:
+                care_bits[self.phy_index[phy], self.reg_index[reg]] = bits
+
+        mismatches = (self.data ^ expected[None, :, :, None]) & care_bits[None, :, :, None]
+        return np.where(self.mask & known[None, :, :, None], mismatches, 0).astype(np.uint16)
+
+    def golden_report(self, golden, care=None):
+        mismatches = self.golden_mismatches(golden, care)
+        return [(self.boards[b], self.phys[p], self.registers[r], t, int(mismatches[b, p, r, t]))
+                for b, p, r, t in zip(*np.nonzero(mismatches))]
+
+    def save(self, path):
+        # One compressed .npz with every array stored as its own column; only the used part
+        # of the time axis is written
+        np.savez_compressed(path, values=self.data, valid=self.mask,
+                            boards=np.array(self.boards, dtype=str), phys=np.array(self.phys, dtype=np.int64),
+                            registers=np.array(self.registers, dtype=np.int64),
+                            times=np.array(self.times, dtype=np.float64), labels=np.array(self.labels, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as columns:
+            store = cls(columns["registers"].tolist())
+            store.boards = columns["boards"].tolist()
+            store.board_index = {board: index for index, board in enumerate(store.boards)}
+            store.phys = columns["phys"].tolist()
+            store.phy_index = {phy: index for index, phy in enumerate(store.phys)}
+            store.times = columns["times"].tolist()
+            store.labels = columns["labels"].tolist()
+            store.values = columns["values"]
+            store.valid = columns["valid"]
+        return store
+
+
+def append_snapshot(path, dumps, label=""):
+    # Loads and rewrites the whole file, so each append costs as much as the store is big.
+    # That is fine for sweeps of a few thousand dumps; to record more, add() to one
+    # SnapshotStore in memory and save() it once at the end.
+    if not path.endswith(".npz"):
+        path += ".npz"  # np.savez adds it anyway, and the existence check must see the same file
+    store = SnapshotStore.load(path) if os.path.exists(path) else SnapshotStore()
+    slot = store.add(dumps, label=label)
+    store.save(path)
+    return slot
+
+
+def bit_list(bits):
+    return ", ".join(str(bit) for bit in range(15, -1, -1) if bits >> bit & 1)
+
+
+def cmd_list(store, args):
+    for slot, (timestamp, label) in enumerate(zip(store.times, store.labels)):
+        boards = [board for index, board in enumerate(store.boards) if store.mask[index, ..., slot].any()]
+        print(f"{slot}\t{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}\t{label}\t{', '.join(boards)}")
+
+
+def cmd_diff(store, args):
+    for board, phy, reg, old, new in store.changes(args.first, args.second):
+        print(f"{board} PHY {phy} REG 0x{reg:02X}: {old:04X} -> {new:04X} (bits {bit_list(old ^ new)})")
+
+
+def cmd_toggles(store, args):
+    toggles = store.bit_toggles()
+    for b, p, r in zip(*np.nonzero(toggles.any(axis=-1))):
+        counts = ", ".join(f"{bit}:{toggles[b, p, r, bit]}" for bit in range(15, -1, -1) if toggles[b, p, r, bit])
+        print(f"{store.boards[b]} PHY {store.phys[p]} REG 0x{store.registers[r]:02X}: {counts}")
+
+
+def cmd_golden(store, args):
+    golden = store.snapshot(args.board or store.boards[0], args.slot)
+    for board, phy, reg, slot, bits in store.golden_report(golden):
+        print(f"{slot}\t{board} PHY {phy} REG 0x{reg:02X}: bits {bit_list(bits)}")
+
+
+COMMANDS = {
+    "list": cmd_list,
+    "diff": cmd_diff,
+    "toggles": cmd_toggles,
+    "golden": cmd_golden,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query register snapshot files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="list snapshots").add_argument("snapshots")
+
+    diff = sub.add_parser("diff", help="registers that changed between two snapshots")
+    diff.add_argument("snapshots")
+    diff.add_argument("first", type=int)
+    diff.add_argument("second", type=int)
+
+    sub.add_parser("toggles", help="per-bit toggle counts over all snapshots").add_argument("snapshots")
+
+    golden = sub.add_parser("golden", help="bits that differ from a golden snapshot")
+    golden.add_argument("snapshots")
+    golden.add_argument("slot", type=int, help="snapshot to use as the golden reference")
+    golden.add_argument("--board", help="board of the golden snapshot (default: the first)")
+
+    args = parser.parse_args(argv)
+    store = SnapshotStore.load(args.snapshots)
+    COMMANDS[args.command](store, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phy_client import PhyClient  # noqa: E402
+from phy_simulator import PhySimulator  # noqa: E402
+
+
+@pytest.fixture
+def simulator():
+    # Text-only firmware: the tombstone and FIFO matching only exist in the text protocol
+    simulator = PhySimulator(latency=0.001, binary=False, seed=1)
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def client(simulator):
+    client = PhyClient()
+    client.connect(simulator.slave_path)
+    yield client
+    client.disconnect()
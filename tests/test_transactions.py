@@ -0,0 +1,50 @@
+import pytest
+
+
+def registers(simulator, phy=1):
+    return next(candidate for candidate in simulator.phys if candidate.address == phy).registers
+
+
+def test_late_response_absorbed_by_tombstone(simulator, client):
+    engine = client.transactions
+    registers(simulator)[2] = 0x1111
+    simulator.stall(0.4)
+    with pytest.raises(TimeoutError):
+        engine.read(1, 2, timeout=0.1).wait()
+    # The stalled 0x1111 arrives first and must not complete the next read of the register
+    registers(simulator)[2] = 0x2222
+    assert engine.read(1, 2).wait() == 0x2222
+    assert not engine.tombstones
+    assert not engine.pending
+
+
+def test_read_retried_after_timeout(simulator, client):
+    simulator.drop_responses(1)
+    assert client.transactions.read(1, 2).wait() == 0x2000
+    stats = client.latency()["READ"]
+    assert stats["retries"] == 1
+    assert stats["timeouts"] == 0
+
+
+def test_stalled_read_completes_and_retry_response_is_absorbed(simulator, client):
+    engine = client.transactions
+    registers(simulator)[2] = 0x1111
+    simulator.stall(0.7)  # past the first deadline, inside the backed-off one
+    assert engine.read(1, 2).wait() == 0x1111
+    registers(simulator)[2] = 0x2222
+    assert engine.read(1, 2).wait() == 0x2222
+    assert client.latency()["READ"]["retries"] == 1
+
+
+def test_reads_of_one_register_matched_in_order(simulator, client):
+    operations = [("read", 1, 2), ("write", 1, 2, 0x1234), ("read", 1, 2), ("write", 1, 2, 0x5678), ("read", 1, 2)]
+    transactions = client.transactions.batch(operations)
+    assert [txn.wait() for txn in transactions] == [0x2000, 0x1234, 0x1234, 0x5678, 0x5678]
+    assert not client.transactions.pending
+
+
+def test_write_latency_recorded_in_text_mode(simulator, client):
+    for value in (1, 2, 3):
+        client.transactions.write(1, 4, value).wait()
+    assert client.latency()["WRITE"]["count"] == 3
+    assert registers(simulator)[4] == 3
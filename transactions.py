@@ -0,0 +1,419 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from binary_protocol import OP_READ, OP_WRITE, encode_frame
+from metrics import LatencyMetrics
+from response_parser import ErrorResponse, ReadResponse, parse_number
+
+TOMBSTONE_TTL = 5.0  # how long a late response to a read that timed out is still expected
+
+
+class Transaction(Future):
+    def __init__(self, command, phy, reg, deadline):
+        super().__init__()
+        self.command = command
+        self.phy = phy
+        self.reg = reg
+        self.deadline = deadline
+        self.cached = False
+        self.value = None  # value being written, for binary write acknowledgements
+        self.kind = command.split("_", 1)[0]  # READ or WRITE, the key for latency metrics
+        self.sent_at = None
+        self.position = 0  # unanswered commands ahead of this one when it was sent
+        self.attempts = 0
+        self.adaptive = False  # deadline came from observed latency, so expire() may retry
+        self.seq = 0  # send order among text reads, see TransactionEngine.purge_tombstones()
+        self.shadowed = False  # a tombstone ahead of it took a response that may have been its own
+
+    def wait(self):
+        # Block for the result; expire() fails the transaction at its deadline, the extra
+        # second only guards against a reader that has stopped running. A retry moves the
+        # deadline, so keep waiting as long as it does.
+        while True:
+            deadline = self.deadline
+            try:
+                return self.result(timeout=max(0, deadline - time.time()) + 1)
+            except TimeoutError:
+                if self.done() or self.deadline == deadline:
+                    raise
+
+
+class Tombstone:
+    # Holds the place of a text read whose response is overdue. The firmware answers reads of
+    # a register in order, so a late response lands here and is dropped instead of completing
+    # the next read of that register with a stale value.
+    __slots__ = ("key", "seq", "deadline")
+
+    def __init__(self, key, seq, deadline):
+        self.key = key
+        self.seq = seq
+        self.deadline = deadline
+
+    def done(self):
+        return True
+
+
+class CacheEntry:
+    __slots__ = ("value", "read_at", "dirty")
+
+    def __init__(self, value, read_at, dirty=False):
+        self.value = value
+        self.read_at = read_at
+        self.dirty = dirty
+
+
+class RegisterCache:
+    # Clause 22 registers whose contents change under the host's feet (status, link partner,
+    # latched bits) plus the MMD access pair, whose meaning depends on the last write to reg 13
+    DEFAULT_VOLATILE = {1, 5, 6, 8, 10, 13, 14}
+
+    def __init__(self, max_age=None):
+        self.entries = {}  # (phy, reg) -> CacheEntry
+        self.volatile = set(self.DEFAULT_VOLATILE)
+        self.max_age = max_age  # seconds a non-volatile value stays valid; None means until written
+        self.register_max_age = {}
+
+    def set_volatile(self, reg, volatile=True):
+        if volatile:
+            self.volatile.add(reg)
+        else:
+            self.volatile.discard(reg)
+
+    def set_max_age(self, reg, max_age):
+        self.register_max_age[reg] = max_age
+
+    def update(self, phy, reg, value):
+        self.entries[(phy, reg)] = CacheEntry(value, time.time())
+
+    def mark_written(self, phy, reg, value):
+        self.entries[(phy, reg)] = CacheEntry(value, time.time(), dirty=True)
+
+    def peek(self, phy, reg):
+        return self.entries.get((phy, reg))
+
+    def is_fresh(self, phy, reg, max_age=None):
+        # max_age, when given, bounds the age for this check on top of the register's own limit
+        entry = self.entries.get((phy, reg))
+        if entry is None or entry.dirty or reg in self.volatile:
+            return False
+        age = time.time() - entry.read_at
+        limit = self.register_max_age.get(reg, self.max_age)
+        return (limit is None or age <= limit) and (max_age is None or age <= max_age)
+
+    def get(self, phy, reg):
+        return self.entries[(phy, reg)].value if self.is_fresh(phy, reg) else None
+
+    def invalidate(self, phy=None):
+        if phy is None:
+            self.entries.clear()
+        else:
+            for key in [key for key in self.entries if key[0] == phy]:
+                del self.entries[key]
+
+
+class TransactionEngine:
+    def __init__(self, serial_manager, timeout=0.5, retries=1):
+        self.serial_manager = serial_manager
+        self.timeout = timeout  # until the first responses arrive; then deadlines follow metrics
+        self.retries = retries  # resends of a timed-out read before it fails
+        self.metrics = LatencyMetrics(timeout)
+        self.pending = {}  # (phy, reg) -> deque of outstanding reads, oldest first
+        self.pending_seq = {}  # sequence number -> transaction, in binary framing mode
+        self.binary = False
+        self.next_seq = 0
+        self.text_seq = 0
+        self.tombstones = []
+        self.lock = threading.Lock()
+        self.cache = RegisterCache()
+
+    def read(self, phy_addr, reg_id, timeout=None, use_cache=False):
+        return self.read_many([(phy_addr, reg_id)], timeout, use_cache)[0]
+
+    def read_many(self, requests, timeout=None, use_cache=False):
+        return self.batch([("read", phy_addr, reg_id) for phy_addr, reg_id in requests], timeout, use_cache)
+
+    def batch(self, operations, timeout=None, use_cache=False):
+        # operations: ("read", phy, reg) or ("write", phy, reg, value), sent in order as one burst.
+        # Without a timeout each command gets a deadline from the observed latency and its
+        # place in the burst, and reads that time out are retried.
+        transactions = []
+        writes = []
+        outgoing = []
+        # Queue and write under the port's send lock, so no other burst lands between these
+        # commands and the firmware answers them in the order they were queued
+        with self.serial_manager.send_lock:
+            now = time.time()
+            with self.lock:
+                binary = self.binary
+                ahead = self.outstanding()
+                for operation in operations:
+                    kind, phy_addr, reg_id = operation[:3]
+                    if kind == "write":
+                        value = operation[3]
+                        command = f"WRITE_{phy_addr}_{reg_id}_{value:04X}"
+                        txn = Transaction(command, parse_number(phy_addr), parse_number(reg_id), now)
+                        self.schedule(txn, ahead + len(outgoing), now, timeout)
+                        self.cache.mark_written(txn.phy, txn.reg, value)
+                        self.record("write", txn.phy, txn.reg, value)
+                        if binary:
+                            outgoing.append(self.frame_for(txn, OP_WRITE, value))
+                        else:
+                            writes.append((txn, value))
+                            outgoing.append(command)
+                    else:
+                        command = f"READ_{phy_addr}_{reg_id}"
+                        txn = Transaction(command, parse_number(phy_addr), parse_number(reg_id), now)
+                        if use_cache and self.cache.is_fresh(txn.phy, txn.reg):
+                            txn.cached = True
+                            txn.set_result(self.cache.get(txn.phy, txn.reg))
+                            transactions.append(txn)
+                            continue
+                        self.schedule(txn, ahead + len(outgoing), now, timeout)
+                        if binary:
+                            outgoing.append(self.frame_for(txn, OP_READ))
+                        else:
+                            self.text_seq += 1
+                            txn.seq = self.text_seq
+                            self.pending.setdefault((txn.phy, txn.reg), deque()).append(txn)
+                            outgoing.append(command)
+                    transactions.append(txn)
+
+            if binary:
+                self.serial_manager.send_bytes(b"".join(outgoing))
+            else:
+                self.serial_manager.send_many(outgoing)
+        # Text-mode firmware does not acknowledge writes; the slot completes once the command
+        # is on the wire, and that is the WRITE latency recorded for it. Binary frames are
+        # acknowledged and complete in handle_frame().
+        for txn, value in writes:
+            self.complete(txn, value)
+        return transactions
+
+    def outstanding(self):
+        # Commands still in flight; the firmware answers in order, so new ones queue behind them.
+        # Caller holds the lock
+        return sum(len(queue) for queue in self.pending.values()) + len(self.pending_seq)
+
+    def schedule(self, txn, position, now, timeout=None):
+        # Caller holds the lock
+        if txn.sent_at is None:
+            txn.sent_at = now
+        txn.position = position
+        txn.attempts += 1
+        txn.adaptive = not timeout
+        if timeout:
+            txn.deadline = now + timeout
+        else:
+            # Timeouts back the estimate off (see LatencyMetrics), so a retry waits longer
+            txn.deadline = now + self.metrics.timeout(txn.kind, position)
+
+    def resend(self, transactions):
+        # Only reads come back here: they are idempotent, so a lost one can simply go out
+        # again. Writes are never repeated behind the caller's back. In text mode the read
+        # keeps its place in the queue and a tombstone behind it takes whichever of the two
+        # responses arrives second. Caller holds the send lock, so the resend cannot land in
+        # the middle of another thread's burst.
+        now = time.time()
+        outgoing = []
+        with self.lock:
+            binary = self.binary
+            ahead = self.outstanding()
+            for position, txn in enumerate(transactions, ahead):
+                self.schedule(txn, position, now)
+                if binary:
+                    outgoing.append(self.frame_for(txn, OP_READ))
+                else:
+                    # Whichever response comes second arrives before the resent read's deadline.
+                    # A shadowed read has most likely had its response already, so only the
+                    # resent one is coming; burying a slot would swallow the next read's answer.
+                    self.text_seq += 1
+                    if not txn.shadowed:
+                        self.bury((txn.phy, txn.reg), self.text_seq, txn.deadline)
+                    txn.shadowed = False
+                    outgoing.append(txn.command)
+        if binary:
+            self.serial_manager.send_bytes(b"".join(outgoing))
+        else:
+            self.serial_manager.send_many(outgoing)
+
+    def bury(self, key, seq, deadline, index=None):
+        # Caller holds the lock
+        tombstone = Tombstone(key, seq, deadline)
+        queue = self.pending.setdefault(key, deque())
+        if index is None:
+            queue.append(tombstone)
+        else:
+            queue[index] = tombstone
+        self.tombstones.append(tombstone)
+
+    def purge_tombstones(self, seq):
+        # Caller holds the lock. Responses arrive in send order, so once the response to read
+        # number seq is in, every tombstone from before it was waiting for a response that was lost
+        dead = [tombstone for tombstone in self.tombstones if tombstone.seq < seq]
+        if not dead:
+            return
+        self.tombstones = [tombstone for tombstone in self.tombstones if tombstone.seq >= seq]
+        for tombstone in dead:
+            queue = self.pending.get(tombstone.key)
+            if queue is not None:
+                try:
+                    queue.remove(tombstone)
+                except ValueError:
+                    pass
+                if not queue:
+                    del self.pending[tombstone.key]
+
+    def complete(self, txn, value):
+        if txn.done():
+            return
+        self.metrics.record(txn.kind, time.time() - txn.sent_at, txn.position, retried=txn.attempts > 1)
+        txn.set_result(value)
+
+    def frame_for(self, txn, op, value=0):
+        # Caller holds the lock
+        seq = self.next_seq
+        while seq in self.pending_seq:
+            seq = (seq + 1) & 0xFFFF
+        self.next_seq = (seq + 1) & 0xFFFF
+        txn.value = value
+        self.pending_seq[seq] = txn
+        return encode_frame(seq, op, txn.phy, txn.reg, value)
+
+    def dump(self, phy_addrs, registers=range(32), timeout=None, use_cache=False):
+        requests = [(phy_addr, reg) for phy_addr in phy_addrs for reg in registers]
+        return self.read_many(requests, timeout, use_cache)
+
+    def dump_values(self, phy_addrs, registers=range(32), timeout=None, use_cache=False):
+        results = {}
+        for txn in self.dump(phy_addrs, registers, timeout, use_cache):
+            try:
+                results[(txn.phy, txn.reg)] = txn.wait()
+            except (TimeoutError, ConnectionError, OSError):
+                results[(txn.phy, txn.reg)] = None
+        return results
+
+    def write(self, phy_addr, reg_id, value):
+        return self.batch([("write", phy_addr, reg_id, value)])[0]
+
+    def record(self, kind, phy, reg, value):
+        capture = self.serial_manager.capture
+        if capture:
+            capture.transaction(kind, phy, reg, value)
+
+    def handle_event(self, event):
+        if isinstance(event, ReadResponse):
+            self.cache.update(event.phy, event.reg, event.value)
+            self.record("read", event.phy, event.reg, event.value)
+            txn = self.pop_pending(event.phy, event.reg)
+            if isinstance(txn, Transaction):
+                self.complete(txn, event.value)
+        elif isinstance(event, ErrorResponse) and event.command and event.command.startswith("READ_"):
+            # The firmware rejected a read: fail it now instead of letting it time out
+            try:
+                _, phy_addr, reg_id = event.command.split("_", 2)
+                txn = self.pop_pending(parse_number(phy_addr), parse_number(reg_id))
+            except ValueError:
+                return
+            if isinstance(txn, Transaction) and not txn.done():
+                txn.set_exception(OSError(f"{txn.command} failed"))
+
+    def pop_pending(self, phy, reg):
+        with self.lock:
+            queue = self.pending.get((phy, reg))
+            if not queue:
+                return None
+            txn = queue.popleft()
+            if not queue:
+                del self.pending[(phy, reg)]
+            if isinstance(txn, Tombstone):
+                self.tombstones.remove(txn)
+                for waiting in queue:
+                    if isinstance(waiting, Transaction):
+                        waiting.shadowed = True
+            self.purge_tombstones(txn.seq)
+        return txn
+
+    def handle_frame(self, frame):
+        with self.lock:
+            txn = self.pending_seq.pop(frame.seq, None)
+        if txn is None or txn.done():
+            return
+        if frame.is_error:
+            txn.set_exception(OSError(f"{txn.command} failed"))
+            return
+        if frame.request_op == OP_READ:
+            self.cache.update(txn.phy, txn.reg, frame.value)
+            self.record("read", txn.phy, txn.reg, frame.value)
+            self.complete(txn, frame.value)
+        else:
+            self.complete(txn, txn.value)
+
+    def expire(self):
+        # Runs on the reader thread, which must keep draining responses while another thread
+        # writes a long burst, so it never waits for the send lock; a busy port is checked
+        # again on the next pass
+        send_lock = self.serial_manager.send_lock
+        if not send_lock.acquire(blocking=False):
+            return
+        try:
+            self.expire_locked()
+        finally:
+            send_lock.release()
+
+    def expire_locked(self):
+        # Caller holds the send lock
+        now = time.time()
+        expired = []
+        retry = []
+        with self.lock:
+            for key in list(self.pending):
+                queue = self.pending[key]
+                for index, txn in enumerate(queue):
+                    if txn.deadline > now:
+                        continue
+                    if isinstance(txn, Tombstone):
+                        continue  # dropped below
+                    if txn.done():
+                        self.bury(key, txn.seq, now + TOMBSTONE_TTL, index)
+                    elif txn.adaptive and txn.attempts <= self.retries:
+                        retry.append(txn)  # stays queued; resend() buries a slot for the extra response
+                    else:
+                        self.bury(key, txn.seq, now + TOMBSTONE_TTL, index)
+                        expired.append(txn)
+            stale = [tombstone for tombstone in self.tombstones if tombstone.deadline <= now]
+            for tombstone in stale:
+                self.pending[tombstone.key].remove(tombstone)
+                self.tombstones.remove(tombstone)
+            for key in [key for key, queue in self.pending.items() if not queue]:
+                del self.pending[key]
+            for seq, txn in list(self.pending_seq.items()):
+                if txn.deadline <= now:
+                    del self.pending_seq[seq]
+                    if txn.done():
+                        continue
+                    if txn.adaptive and txn.kind == "READ" and txn.attempts <= self.retries:
+                        retry.append(txn)
+                    else:
+                        expired.append(txn)
+
+        for txn in retry:
+            self.metrics.record_retry(txn.kind)
+        for txn in expired:
+            if not txn.done():
+                self.metrics.record_timeout(txn.kind)
+                txn.set_exception(TimeoutError(f"{txn.command} timed out"))
+        if retry:
+            self.resend(retry)
+
+    def fail_all(self, error):
+        with self.lock:
+            outstanding = [txn for queue in self.pending.values() for txn in queue]
+            outstanding += self.pending_seq.values()
+            self.pending.clear()
+            self.pending_seq.clear()
+            self.tombstones = []
+        for txn in outstanding:
+            if not txn.done():
+                txn.set_exception(error)
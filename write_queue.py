@@ -0,0 +1,151 @@
+import threading
+from concurrent.futures import Future
+
+from transactions import parse_number
+
+
+class VerifyError(OSError):
+    def __init__(self, command, expected, actual, mask):
+        super().__init__(f"{command} read back {actual:04X}, expected {expected:04X} (mask {mask:04X})")
+        self.expected = expected
+        self.actual = actual
+        self.mask = mask
+
+
+class QueuedWrite:
+    __slots__ = ("phy_addr", "reg_id", "phy", "reg", "value", "mask", "verify", "futures")
+
+    def __init__(self, phy_addr, reg_id):
+        self.phy_addr = phy_addr
+        self.reg_id = reg_id
+        self.phy = parse_number(phy_addr)
+        self.reg = parse_number(reg_id)
+        self.value = 0
+        self.mask = 0
+        self.verify = False
+        self.futures = []
+
+    def fail(self, error):
+        for future in self.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def resolve(self, value):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(value)
+
+
+class WriteQueue:
+    # Holds register writes for a short window, then sends them as one pipelined burst.
+    # Writes to the same register within the window merge into one, later bits winning.
+    # A masked write changes only the bits in its mask; the other bits come from one read
+    # burst ahead of the writes. With verify, each register is read back in the same burst
+    # right after it is written.
+    def __init__(self, engine, window=0.02, verify=False, cache_age=None):
+        self.engine = engine
+        self.window = window
+        self.verify = verify
+        # Cached values younger than this many seconds stand in for the read. None always reads:
+        # a non-volatile entry never expires by itself, and anything another broker client or
+        # a firmware function changed would be written back stale.
+        self.cache_age = cache_age
+        self.queue = {}  # (phy, reg) -> QueuedWrite, in the order first queued
+        self.lock = threading.Lock()
+        self.send_lock = threading.RLock()  # one burst at a time, so writes keep their order
+        self.timer = None
+        self.requested = 0
+        self.sent = 0
+
+    def write(self, phy_addr, reg_id, value, mask=0xFFFF, verify=None):
+        # Returns a Future for the value the register ends up with (the read-back when verifying)
+        future = Future()
+        mask &= 0xFFFF
+        with self.lock:
+            key = (parse_number(phy_addr), parse_number(reg_id))
+            entry = self.queue.get(key)
+            if entry is None:
+                entry = self.queue[key] = QueuedWrite(phy_addr, reg_id)
+            entry.value = (entry.value & ~mask | value & mask) & 0xFFFF
+            entry.mask |= mask
+            entry.verify = entry.verify or (self.verify if verify is None else verify)
+            entry.futures.append(future)
+            self.requested += 1
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return future
+
+    def flush(self):
+        # Sends everything queued so far and blocks until the burst has completed
+        with self.send_lock:
+            with self.lock:
+                entries = list(self.queue.values())
+                self.queue = {}
+                timer, self.timer = self.timer, None
+            if timer:
+                timer.cancel()
+            if not entries:
+                return
+            try:
+                self.send(self.fill_masked(entries))
+            except Exception as e:
+                for entry in entries:
+                    entry.fail(e)
+
+    def flush_registers(self, keys):
+        # Sends now if anything is queued for one of these (phy, reg) registers, and waits for a
+        # burst already going out, so a write still in its window cannot land after a direct
+        # write to the same register and undo it
+        with self.send_lock:
+            with self.lock:
+                queued = any(key in self.queue for key in keys)
+            if queued:
+                self.flush()
+
+    def fill_masked(self, entries):
+        engine = self.engine
+        unread = []
+        for entry in entries:
+            if entry.mask == 0xFFFF:
+                continue
+            if self.cache_age is not None and engine.cache.is_fresh(entry.phy, entry.reg, self.cache_age):
+                entry.value |= engine.cache.get(entry.phy, entry.reg) & ~entry.mask & 0xFFFF
+            else:
+                unread.append(entry)
+
+        failed = set()
+        reads = engine.read_many([(entry.phy_addr, entry.reg_id) for entry in unread]) if unread else []
+        for entry, txn in zip(unread, reads):
+            try:
+                entry.value |= txn.wait() & ~entry.mask & 0xFFFF
+            except Exception as e:
+                entry.fail(e)
+                failed.add(entry)
+        return [entry for entry in entries if entry not in failed]
+
+    def send(self, entries):
+        operations = []
+        for entry in entries:
+            operations.append(("write", entry.phy_addr, entry.reg_id, entry.value))
+            if entry.verify:
+                operations.append(("read", entry.phy_addr, entry.reg_id))
+        transactions = iter(self.engine.batch(operations))
+        self.sent += len(entries)
+
+        for entry in entries:
+            write = next(transactions)
+            read = next(transactions) if entry.verify else None
+            try:
+                write.wait()
+                if read is None:
+                    entry.resolve(entry.value)
+                    continue
+                actual = read.wait()
+                # Only the bits that were asked for; the rest may be latched or self-clearing
+                if (actual ^ entry.value) & entry.mask:
+                    raise VerifyError(write.command, entry.value, actual, entry.mask)
+                entry.resolve(actual)
+            except Exception as e:
+                entry.fail(e)